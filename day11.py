@@ -85,7 +85,7 @@ once?
 
 """
 import collections
-import intcode9
+import intcode
 
 class Turtle:
     """this emergency hull-painting robot is very LOGO-like"""
@@ -93,7 +93,7 @@ class Turtle:
     DirectionNames = ["up", "right", "down", "left"]
     DirectionSymbols = ["^", ">", "v", "<"]
 
-    def __init__(self, initial = 0):
+    def __init__(self, initial = 0, engine = intcode.DEFAULT_ENGINE):
         self.direction = 0
         self.pos = (0,0)
         self.field = collections.defaultdict(int)
@@ -105,7 +105,7 @@ class Turtle:
         def localGetInput(prompt):
             """provide current panel colour as input"""
             nonlocal self
-            intcode9.trace(">> INPUT {} is {}".format(self.pos, self.field[self.pos]))
+            intcode.trace(">> INPUT {} is {}".format(self.pos, self.field[self.pos]))
             return self.field[self.pos]
 
         outputs = 0
@@ -117,7 +117,7 @@ class Turtle:
             isPaintOutput = (outputs % 2 == 0)
             outputs += 1
             if isPaintOutput:
-                intcode9.trace("<< PAINT {} {}".format(self.pos, value))
+                intcode.trace("<< PAINT {} {}".format(self.pos, value))
                 self.written[self.pos] = value
                 self.field[self.pos] = value
             else:
@@ -126,17 +126,14 @@ class Turtle:
                 else:
                     dd = -1
                 direction = (self.direction + dd) % len(Turtle.Directions)
-                intcode9.trace("<< ROTATE {} {} = {}".format(Turtle.DirectionNames[self.direction], ["left","right"][value], Turtle.DirectionNames[direction]))
+                intcode.trace("<< ROTATE {} {} = {}".format(Turtle.DirectionNames[self.direction], ["left","right"][value], Turtle.DirectionNames[direction]))
                 self.direction = direction
                 pos = tuple(c+s for c,s in zip(self.pos, Turtle.Directions[direction]))
-                intcode9.trace("<< MOVE {} from {} to {}".format(Turtle.DirectionNames[self.direction], self.pos, pos))
+                intcode.trace("<< MOVE {} from {} to {}".format(Turtle.DirectionNames[self.direction], self.pos, pos))
                 self.pos = pos
 
-            
-        intcode9.getInput = localGetInput
-        intcode9.writeOutput = localWriteOutput
 
-        self.ipc = intcode9.makeIntcodeProcessor()
+        self.ipc = intcode.makeIntcodeProcessor(engine, localGetInput, localWriteOutput)
 
     def execute(self, program):
         self.ipc.execute(program)
@@ -168,33 +165,28 @@ class Turtle:
 import sys
 if __name__=='__main__':
     if len(sys.argv) > 2 and sys.argv[2] == '-v':
-        intcode9.TRACE=1
+        intcode.setTrace()
 
     if len(sys.argv) < 2:
         print("Syntax: {} <program file> [-v]".format(sys.argv[0]))
         sys.exit(1)
 
-    progfile = open(sys.argv[1], 'r')
-
     ## import pdb
     ## pdb.set_trace()
     ## ipc.execute([2,3,0,3,99])
 
-    line = progfile.readline().strip()
-    while line.startswith('#'):
-        ## print (and skip) comments starting with hash
-        print(line)
-        line = progfile.readline().strip()
-
-    inprog = [int(x) for x in line.split(',')]
+    inprog = intcode.loadProgram(sys.argv[1])
 
     initial = 0
     if len(sys.argv) > 2 and sys.argv[2] == '--part2':
         initial = 1
 
-    turtle = Turtle(initial)
+    profile = intcode.optionFromArgs(sys.argv[2:], 'profile')
+    turtle = Turtle(initial, 'profiling' if profile else intcode.engineFromArgs(sys.argv[2:]))
     turtle.execute(inprog)
     print("painted {} panels (at least once)".format(turtle.totalPainted()))
+    if profile:
+        print(turtle.ipc.profile.report(profile))
 
     if initial:
         print(" --- final state --- ")
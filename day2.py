@@ -1,91 +1,277 @@
-TRACE=0
-def trace(s):
-    if TRACE:
-        print(s)
+import intcode
+from intcode import trace
 
-class OpcodeAdd:
-    OPC = 1
-    LEN = 4
+def makeIntcodeProcessor(engine='threaded'):
+    """
+    the day 2 machine: ADD, MUL and END only
 
-    @staticmethod
-    def execute(source, pc):
-        in1addr = source[pc + 1]
-        in2addr = source[pc + 2]
-        outaddr = source[pc + 3]
-        in1 = source[in1addr]
-        in2 = source[in2addr]
-        trace("ADD (*{0}={1}) (*{2}={3}) -> *{4}".format(in1addr, in1, in2addr, in2, outaddr))
-        source[outaddr] = in1 + in2
-        return pc + OpcodeAdd.LEN
-
-class OpcodeMul:
-    OPC = 2
-    LEN = 4
+    day 2 code is straight-line, so there is nothing for the block engine to find hot and a single run is fastest on
+    threaded closures
+    """
+    return intcode.makeIntcodeProcessor(engine, opcodes=intcode.DAY2_OPS)
 
-    @staticmethod
-    def execute(source, pc):
-        in1addr = source[pc + 1]
-        in2addr = source[pc + 2]
-        outaddr = source[pc + 3]
-        in1 = source[in1addr]
-        in2 = source[in2addr]
-        trace("MUL (*{0}={1}) (*{2}={3}) -> *{4}".format(in1addr, in1, in2addr, in2, outaddr))
-        source[outaddr] = in1 * in2
-        return pc + OpcodeMul.LEN
-
-class OpcodeEnd:
-    OPC = 99
-    LEN = 1
+## noun/verb search: each worker process loads and decodes the program once and restores a snapshot of it between
+## runs, so only the instruction holding the noun and verb is decoded again each time. It runs on the decode engine,
+## the one whose snapshots share memory pages and decoded instructions rather than copying them
+SEARCH_ENGINE = 'decode'
+_image = None
+_ipc = None
+
+def _initWorker(program):
+    global _image, _ipc
+    _ipc = makeIntcodeProcessor(SEARCH_ENGINE)
+    _ipc.load(program)
+    _ipc.predecode()
+    _image = _ipc.snapshot()
+
+def runNounVerb(noun, verb):
+    """run the worker's image with the given noun and verb, returning address 0 (None if the program fails)"""
+    _ipc.restore(_image)
+    _ipc.poke(1, noun)
+    _ipc.poke(2, verb)
+    try:
+        _ipc.run()
+    except (KeyError, IndexError, AssertionError):
+        return None
+    return _ipc.dat[0]
+
+def searchNoun(noun, verbs, target):
+    """try every verb for one noun; returns (noun, matching verb or None, runs made)"""
+    runs = 0
+    for verb in verbs:
+        runs += 1
+        if runNounVerb(noun, verb) == target:
+            return noun, verb, runs
+    return noun, None, runs
+
+import concurrent.futures
+def searchNounVerb(program, target, nouns=range(100), verbs=range(100), workers=None):
+    """
+    find a (noun, verb) pair that makes the program leave target at address 0, one noun per task spread across
+    worker processes (workers=1 searches in this process)
+
+    returns ((noun, verb) or None, number of runs made), the first match in noun order whichever worker finds what
+    first; once a match turns up no nouns after it are started, but the ones before it still finish. Runs made for
+    nouns after the match (by tasks already under way) are not counted, so the count is the one a search in this
+    process gives
+    """
+    verbs = list(verbs)
+    if workers == 1:
+        _initWorker(program)
+        runs = 0
+        for noun in nouns:
+            _, verb, n = searchNoun(noun, verbs, target)
+            runs += n
+            if verb is not None:
+                return (noun, verb), runs
+        return None, runs
+
+    with concurrent.futures.ProcessPoolExecutor(workers, initializer=_initWorker, initargs=(program,)) as pool:
+        futures = [pool.submit(searchNoun, noun, verbs, target) for noun in nouns]
+        order = dict((future, i) for i, future in enumerate(futures))
+        counts = [0] * len(futures) # runs made for each noun
+        found = None
+        first = len(futures) # position of the earliest matching noun so far
+        for future in concurrent.futures.as_completed(futures):
+            if future.cancelled():
+                continue
+            noun, verb, n = future.result()
+            counts[order[future]] = n
+            if verb is not None and order[future] < first:
+                found = (noun, verb)
+                first = order[future]
+                for f in futures[first + 1:]:
+                    f.cancel()
+        return found, sum(counts[:first + 1])
+
+def searchNounVerbLockstep(program, target, nouns=range(100), verbs=range(100)):
+    """
+    brute force on the lockstep engine: every (noun, verb) pair is a lane of one batch, run together
+
+    returns ((noun, verb) or None, number of runs made), the first match in noun order like the other searches
+    """
+    from intcode.lockstep import LockstepBatch
+    pairs = [(noun, verb) for noun in nouns for verb in verbs]
+    batch = LockstepBatch(program, len(pairs), intcode.DAY2_OPS)
+    batch.poke(1, [noun for noun, _ in pairs])
+    batch.poke(2, [verb for _, verb in pairs])
+    batch.run()
+    results = batch.peek(0).tolist()
+    for lane, pair in enumerate(pairs):
+        if batch.status(lane) == intcode.HALTED and results[lane] == target:
+            return pair, len(pairs)
+    return None, len(pairs)
+
+class Poly:
+    """polynomial in the noun and verb, held as {(noun power, verb power): coefficient}"""
+    def __init__(self, terms):
+        self.terms = dict((k, c) for k, c in terms.items() if c)
 
     @staticmethod
-    def execute(source, pc):
-        trace("END")
-        raise StopIteration
-
-class IntcodeProcessor:
-    def __init__(self, opcodes):
-        self.ops = dict([(op.OPC, op) for op in opcodes])
-        self.dat = {}
-        self.pc = 0
-
-    def execute_one(self):
-        opcode = self.dat[self.pc]
-        op = self.ops[opcode]
-        nextpc = op.execute(self.dat, self.pc)
-        return nextpc
-
-    def execute(self, program):
-        """program can be any iterable sequence of integer values"""
-        self.dat = dict(enumerate(program))
-        self.pc = 0
-
-        try:
-            while True:
-                npc = self.execute_one()
-                self.pc = npc
-        except StopIteration:
-            return
-        except:
-            print("some kind of error")
+    def const(value):
+        return Poly({(0, 0): value})
+
+    def __add__(self, other):
+        terms = dict(self.terms)
+        for k, c in other.terms.items():
+            terms[k] = terms.get(k, 0) + c
+        return Poly(terms)
+
+    def __mul__(self, other):
+        terms = {}
+        for (i1, j1), c1 in self.terms.items():
+            for (i2, j2), c2 in other.terms.items():
+                k = (i1 + i2, j1 + j2)
+                terms[k] = terms.get(k, 0) + c1 * c2
+        return Poly(terms)
+
+    def constant(self):
+        """the value if this does not depend on noun or verb, else None"""
+        if any(k != (0, 0) for k in self.terms):
+            return None
+        return self.terms.get((0, 0), 0)
+
+    def degree(self):
+        return max((i + j for i, j in self.terms), default=0)
+
+    def __call__(self, noun, verb):
+        return sum(c * noun ** i * verb ** j for (i, j), c in self.terms.items())
+
+    def __str__(self):
+        return " + ".join("{}*n^{}*v^{}".format(c, i, j) for (i, j), c in sorted(self.terms.items())) or "0"
+
+class NotSymbolic(Exception):
+    """the program uses a noun/verb dependent value as an opcode or address, so it has to be run for real"""
+
+## a value read through a noun/verb dependent address: fine as long as nothing ever uses it
+UNKNOWN = None
+
+def symbolicResult(program, nouns=range(100), verbs=range(100)):
+    """
+    run the ADD/MUL/END program once over symbolic noun (address 1) and verb (address 2), returning address 0 as a Poly
+    """
+    dat = dict((a, Poly.const(v)) for a, v in enumerate(program))
+    dat[1] = Poly({(1, 0): 1})
+    dat[2] = Poly({(0, 1): 1})
+    ops = {intcode.OpAdd.OPC: Poly.__add__, intcode.OpMul.OPC: Poly.__mul__}
+
+    def readable(addr):
+        """can every concrete run read through this address?"""
+        if addr is UNKNOWN or addr.degree() > 1:
+            return False
+        if addr.constant() is not None:
+            return addr.constant() in dat
+        # affine, so the extremes are at the corners of the noun/verb ranges
+        corners = [addr(n, v) for n in (min(nouns), max(nouns)) for v in (min(verbs), max(verbs))]
+        return min(corners) >= 0 and max(corners) < len(program)
+
+    pc = 0
+    while True:
+        if dat.get(pc) is UNKNOWN:
+            raise NotSymbolic("opcode at {} is unknown or out of range".format(pc))
+        opcode = dat[pc].constant()
+        if opcode == intcode.OpEnd.OPC:
+            if dat[0] is UNKNOWN:
+                raise NotSymbolic("result depends on a value read through a noun/verb dependent address")
+            return dat[0]
+        if opcode not in ops:
+            raise NotSymbolic("opcode at {} is {}".format(pc, dat[pc]))
+        addrs = [dat.get(a, UNKNOWN) for a in range(pc + 1, pc + 4)]
+        if not all(readable(a) for a in addrs[:2]):
+            raise NotSymbolic("input addresses at {} may be out of range".format(pc))
+        out = addrs[2].constant() if addrs[2] is not UNKNOWN else None
+        if out is None:
+            raise NotSymbolic("output address at {} depends on noun/verb".format(pc))
+        ins = [dat[a.constant()] if a.constant() is not None else UNKNOWN for a in addrs[:2]]
+        trace("[{}] {} {} {} -> *{}".format(pc, opcode, addrs[0], addrs[1], out))
+        if UNKNOWN in ins:
+            dat[out] = UNKNOWN
+        else:
+            dat[out] = ops[opcode](*ins)
+        pc += 4
+
+def solvePoly(poly, target, nouns=range(100), verbs=range(100)):
+    """first (noun, verb) in noun order with poly(noun, verb) == target, solved directly when poly is affine"""
+    if poly.degree() <= 1:
+        a = poly.terms.get((1, 0), 0)
+        b = poly.terms.get((0, 1), 0)
+        c = poly.terms.get((0, 0), 0)
+        verbset = set(verbs)
+        for noun in nouns:
+            rest = target - c - a * noun
+            if b == 0:
+                if rest == 0 and verbset:
+                    return noun, min(verbset)
+            elif rest % b == 0 and rest // b in verbset:
+                return noun, rest // b
+        return None
+    for noun in nouns:
+        for verb in verbs:
+            if poly(noun, verb) == target:
+                return noun, verb
+    return None
+
+def solveNounVerb(program, target, nouns=range(100), verbs=range(100), workers=None):
+    """
+    symbolic pass first, falling back to the brute force search when the program is not symbolic in noun/verb
+
+    returns ((noun, verb) or None, description of how it was found, number of runs made or None if it ran nothing)
+    """
+    try:
+        poly = symbolicResult(program, nouns, verbs)
+    except NotSymbolic as ex:
+        trace("falling back to brute force: {}".format(ex))
+        found, runs = searchNounVerb(program, target, nouns, verbs, workers)
+        return found, "brute force, {} runs".format(runs), runs
+    return solvePoly(poly, target, nouns, verbs), "symbolic, address 0 = {}".format(poly), None
 
 import sys
-import collections
+import time
+
+if __name__=='__main__':
+    if len(sys.argv) > 1 and sys.argv[1] == '-v':
+        intcode.setTrace()
+
+    ## import pdb
+    ## pdb.set_trace()
+    ## ipc.execute([2,3,0,3,99])
 
-if len(sys.argv) > 1 and sys.argv[1] == '-v':
-    TRACE=1
+    inprog = [int(x) for x in sys.stdin.readline().strip().split(',')]
 
-## import pdb
-## pdb.set_trace()
-## ipc.execute([2,3,0,3,99])
+    search = [a.split('=', 1)[1] for a in sys.argv[1:] if a.startswith('--search=')]
+    if search:
+        workers = [int(a.split('=', 1)[1]) for a in sys.argv[1:] if a.startswith('--workers=')]
+        workers = (workers[0] or None) if workers else None
+        started = time.time()
+        if '--lockstep' in sys.argv:
+            try:
+                found, runs = searchNounVerbLockstep(inprog, int(search[0]))
+            except ImportError as ex:
+                print("{}, searching on the {} engine".format(ex, SEARCH_ENGINE))
+                found, runs = searchNounVerb(inprog, int(search[0]), workers=workers)
+            how = "brute force, {} runs".format(runs)
+        elif '--brute' in sys.argv:
+            found, runs = searchNounVerb(inprog, int(search[0]), workers=workers)
+            how = "brute force, {} runs".format(runs)
+        else:
+            found, how, runs = solveNounVerb(inprog, int(search[0]), workers=workers)
+        elapsed = time.time() - started
+        if found:
+            print("noun={} verb={} answer={}".format(found[0], found[1], 100 * found[0] + found[1]))
+        else:
+            print("no noun/verb gives {}".format(search[0]))
+        print("{} in {:.3f}s".format(how, elapsed))
+        if runs is not None:
+            print("{:.0f} runs/sec".format(runs / elapsed if elapsed else 0))
+        sys.exit(0)
 
-inprog = [int(x) for x in sys.stdin.readline().strip().split(',')]
-ipc = IntcodeProcessor([OpcodeAdd, OpcodeMul, OpcodeEnd])
-ipc.execute(inprog)
+    ipc = makeIntcodeProcessor(intcode.engineFromArgs(sys.argv[1:], 'threaded'))
+    try:
+        ipc.execute(inprog)
+    except Exception:
+        print("some kind of error")
 
-print("==result==\nPC={0}".format(ipc.pc))
-maxkey = max(ipc.dat.iterkeys())
-outprog_dict = collections.defaultdict(int, ipc.dat)
-outprog = [outprog_dict[i] for i in range(maxkey+1)]
-print outprog
+    print("==result==\nPC={0}".format(ipc.pc))
+    print(ipc.dat.toList())
 
             
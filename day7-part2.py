@@ -41,51 +41,36 @@ Try every combination of the new phase settings on the amplifier feedback loop.
 
 """
 
-### yield on output and chain to input that way?
-### it's going to be easier to chain with multiprocessing in this case ...
-import intcode7
-
-def runAmpProc(inpipe, outpipe, result, program):
-    # first intercept the inputs
-    def localGetInput(prompt):
-        nonlocal inpipe
-        return inpipe.recv()
-
-    # then intercept the output
-    def localWriteOutput(prompt, value):
-        nonlocal result
-        result.value = value
-        nonlocal outpipe
-        outpipe.send(value)
-
-    # and finally run up our processor
-    intcode7.getInput = localGetInput
-    intcode7.writeOutput = localWriteOutput
-    ipc = intcode7.makeIntcodeProcessor()
-    ipc.execute(program)
-
-import multiprocessing
-
-def runAmpPipeline(phases, program):
-    # one pipe per stage
-    pipes = [multiprocessing.Pipe() for _ in phases]
-    initial_input = pipes[0][0] # first stage reads from the other end of this pipe
-    final_output = pipes[-1][1] # last stage writes to the other end of this pipe
-    io_pairs = [(i[1], o[0]) for i,o in zip(pipes[:-1],pipes[1:])] + [(final_output, initial_input)]
-    params = [(i, o, multiprocessing.Value('i', 0)) for i,o in io_pairs]
-    # start all the subprocesses
-    stages = [multiprocessing.Process(target=runAmpProc, args=(i, o, v, program)) for i,o,v in params]
-    for stage in stages:
-        stage.start()
-    # send the phase to each subprocess as its first input
-    for phase, io in zip(phases, pipes):
-        io[0].send(phase)
+### each amplifier is a resumable machine, chained through their input queues and stepped round-robin
+import intcode
+
+def runAmpPipeline(phases, program, engine='decode'):
+    """run the feedback loop in-process: each stage runs until it blocks on input, its outputs go to the next stage"""
+    amps = [intcode.makeIntcodeProcessor(engine, opcodes=intcode.DAY5_PART2_OPS) for _ in phases]
+    for amp, phase in zip(amps, phases):
+        amp.start(program, [phase])
     # kickoff
-    initial_input.send(0)
-    # wait for the result
-    for stage in stages:
-        stage.join()
-    return params[-1][2].value
+    amps[0].send(0)
+    return runFeedbackLoop(amps)
+
+def runFeedbackLoop(amps, result=None):
+    """step started amplifiers round-robin until they all halt, returning the last value out of the final stage"""
+    running = True
+    while running:
+        running = False
+        progress = False
+        for i, amp in enumerate(amps):
+            status, outputs = amp.run_until_io()
+            if outputs:
+                progress = True
+                amps[(i + 1) % len(amps)].send(*outputs)
+                if i == len(amps) - 1:
+                    result = outputs[-1]
+            if status != intcode.HALTED:
+                running = True
+        if running and not progress:
+            raise RuntimeError("amplifier loop deadlocked: every stage is waiting for input")
+    return result
 
 def testAmpSequence(phases, program):
     """create a separate processor for each sequence, give it the correct phase and pass its output to the next stage
@@ -96,39 +81,116 @@ def testAmpSequence(phases, program):
     return value
 
 import itertools
-def maxAmpSequence(phases, program):
+import functools
+import permsearch
+def maxAmpSequenceTree(phases, program, engine='decode'):
+    """
+    walk the permutation tree depth-first. On the first trip round the loop each amplifier only depends on the
+    phases before it, so that pass is simulated once per distinct prefix; the leaves fork the paused machines and
+    finish the loop from there
+    """
     maxval = 0
     maxseq = None
-    for phase_sequence in itertools.permutations(phases):
-        val = runAmpPipeline(phase_sequence, program)
-        if val > maxval:
-            maxval = val
-            maxseq = phase_sequence
+    def walk(prefix, amps, signal):
+        nonlocal maxval, maxseq
+        remaining = [p for p in phases if p not in prefix]
+        if not remaining:
+            amps = [amp.fork() for amp in amps]
+            amps[0].send(*signal)
+            val = runFeedbackLoop(amps, signal[-1] if signal else None)
+            if val > maxval:
+                maxval = val
+                maxseq = prefix
+            return
+        for p in remaining:
+            amp = intcode.makeIntcodeProcessor(engine, opcodes=intcode.DAY5_PART2_OPS)
+            amp.start(program, [p])
+            amp.send(*signal)
+            _, outputs = amp.run_until_io()
+            walk(prefix + (p,), amps + [amp], outputs)
+    walk((), [], [0])
     return maxval, maxseq
 
+def maxAmpSequence(phases, program, engine='decode', workers=1):
+    """try every phase ordering; with workers > 1 (or None for one per cpu) the search is sharded across processes"""
+    if workers == 1:
+        return maxAmpSequenceTree(phases, program, engine)
+    evaluate = functools.partial(runAmpPipeline, engine=engine)
+    with permsearch.PermutationSearch(evaluate, program, workers) as search:
+        return search.best(phases)
+
+def maxAmpSequenceLockstep(phases, program):
+    """
+    every phase ordering at once on the lockstep engine: one lane per ordering in each amplifier's batch, and the
+    batches are stepped round the loop like runFeedbackLoop() steps single machines
+    """
+    from intcode.lockstep import LockstepBatch, FAULTED
+    orders = list(itertools.permutations(phases))
+    amps = [LockstepBatch(program, len(orders), intcode.DAY5_PART2_OPS) for _ in phases]
+    for stage, amp in enumerate(amps):
+        for lane, order in enumerate(orders):
+            amp.send(lane, order[stage])
+    for lane in range(len(orders)):
+        amps[0].send(lane, 0)
+    signals = [None] * len(orders)
+    running = True
+    while running:
+        running = False
+        progress = False
+        for i, amp in enumerate(amps):
+            amp.run()
+            for lane in range(len(orders)):
+                outputs = amp.takeOutputs(lane)
+                if outputs:
+                    progress = True
+                    amps[(i + 1) % len(amps)].send(lane, *outputs)
+                    if i == len(amps) - 1:
+                        signals[lane] = outputs[-1]
+            counts = amp.counts()
+            if counts[FAULTED]:
+                raise RuntimeError("amplifier {} faulted".format(i))
+            if counts[intcode.NEEDS_INPUT]:
+                running = True
+        if running and not progress:
+            raise RuntimeError("amplifier loop deadlocked: every stage is waiting for input")
+    best = max(range(len(orders)), key=lambda lane: signals[lane])
+    return signals[best], orders[best]
+
+def maxAmpSequenceAsync(phases, program, engine='decode'):
+    """every phase ordering at once, each as a ring of asyncio machines, all on one event loop"""
+    import asyncio
+    from intcode.aio import ring, runAll
+    orders = list(itertools.permutations(phases))
+    async def sweep():
+        rings = [ring([program] * len(order), [[order[0], 0]] + [[p] for p in order[1:]], engine=engine,
+                      opcodes=intcode.DAY5_PART2_OPS) for order in orders]
+        return await asyncio.gather(*[runAll(amps) for amps in rings])
+    signals = [results[-1] for results in asyncio.run(sweep())]
+    best = max(range(len(orders)), key=lambda n: signals[n])
+    return signals[best], orders[best]
+
 import sys
 if __name__=='__main__':
     if len(sys.argv) > 2 and sys.argv[2] == '-v':
-        TRACE=1
+        intcode.setTrace()
 
     if len(sys.argv) < 2:
-        print("Syntax: {} <program file> [-v]".format(sys.argv[0]))
+        print("Syntax: {} <program file> [-v] [--engine=] [--workers=N] [--lockstep] [--async]".format(sys.argv[0]))
         sys.exit(1)
 
-    progfile = open(sys.argv[1], 'r')
-
     ## import pdb
     ## pdb.set_trace()
     ## ipc.execute([2,3,0,3,99])
 
-    line = progfile.readline().strip()
-    while line.startswith('#'):
-        ## print (and skip) comments starting with hash
-        print(line)
-        line = progfile.readline().strip()
-
-    inprog = [int(x) for x in line.split(',')]
-    val, seq = maxAmpSequence([5,6,7,8,9], inprog)
+    inprog = intcode.loadProgram(sys.argv[1])
+    workers = int(intcode.optionFromArgs(sys.argv[2:], 'workers', 1))
+    if '--lockstep' in sys.argv[2:]:
+        val, seq = maxAmpSequenceLockstep([5,6,7,8,9], inprog)
+    elif '--async' in sys.argv[2:]:
+        val, seq = maxAmpSequenceAsync([5,6,7,8,9], inprog, intcode.engineFromArgs(sys.argv[2:], 'decode'))
+    else:
+        val, seq = maxAmpSequence([5,6,7,8,9], inprog, intcode.engineFromArgs(sys.argv[2:], 'decode'),
+                                  workers or None)
     print("max = {}\nfrom sequence {}".format(val, seq))
 
 
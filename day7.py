@@ -46,30 +46,16 @@ Here are some example programs:
 Try every combination of phase settings on the amplifiers. What is the highest signal that can be sent to the thrusters?
 """
 
-### copy of the day5-part.py Intcode processor with added indirection
-import intcode7
+### shared Intcode processor, each amplifier gets its own instance and I/O
+import intcode
+
+## a whole amplifier run only depends on the program and the (phase, signal) pair, so repeats come from the cache
+AMP_RUNS = intcode.RunCache()
 
 def runAmp(inputs, program):
-    # first intercept the inputs
-    working_input = inputs[:]
-    def localGetInput(prompt):
-        nonlocal working_input
-        rv = working_input[0]
-        working_input = working_input[1:]
-        return rv
-
-    # then intercept the output
-    result = None
-    def localWriteOutput(prompt, value):
-        nonlocal result
-        result = value
-
-    # and finally run up our processor
-    intcode7.getInput = localGetInput
-    intcode7.writeOutput = localWriteOutput
-    ipc = intcode7.makeIntcodeProcessor()
-    ipc.execute(program)
-    return result
+    # each amp only runs a short program once, too little for compiling to pay off
+    _, outputs = AMP_RUNS.run(program, inputs, 'decode', intcode.DAY5_PART2_OPS)
+    return outputs[-1] if outputs else None
 
 def testAmpSequence(phases, program):
     """create a separate processor for each sequence, give it the correct phase and pass its output to the next stage
@@ -80,39 +66,64 @@ def testAmpSequence(phases, program):
     return value
 
 import itertools
-def maxAmpSequence(phases, program):
+import permsearch
+def maxAmpSequenceTree(phases, program):
+    """walk the permutation tree depth-first, so the signal out of each distinct prefix is only computed once"""
     maxval = 0
     maxseq = None
-    for phase_sequence in itertools.permutations(phases):
-        val = testAmpSequence(phase_sequence, program)
-        if val > maxval:
-            maxval = val
-            maxseq = phase_sequence
+    def walk(prefix, value):
+        nonlocal maxval, maxseq
+        remaining = [p for p in phases if p not in prefix]
+        if not remaining:
+            if value > maxval:
+                maxval = value
+                maxseq = prefix
+            return
+        for p in remaining:
+            walk(prefix + (p,), runAmp([p, value], program))
+    walk((), 0)
     return maxval, maxseq
 
+def maxAmpSequence(phases, program, workers=1):
+    """try every phase ordering; with workers > 1 (or None for one per cpu) the search is sharded across processes"""
+    if workers == 1:
+        return maxAmpSequenceTree(phases, program)
+    with permsearch.PermutationSearch(testAmpSequence, program, workers) as search:
+        return search.best(phases)
+
+def maxAmpSequenceLockstep(phases, program):
+    """every phase ordering at once on the lockstep engine: one lane per ordering, one batch per amplifier stage"""
+    from intcode.lockstep import LockstepBatch
+    orders = list(itertools.permutations(phases))
+    signals = [0] * len(orders)
+    for stage in range(len(phases)):
+        batch = LockstepBatch(program, len(orders), intcode.DAY5_PART2_OPS)
+        for lane, order in enumerate(orders):
+            batch.send(lane, order[stage], signals[lane])
+        batch.run()
+        signals = [batch.outputs[lane][-1] for lane in range(len(orders))]
+    best = max(range(len(orders)), key=lambda lane: signals[lane])
+    return signals[best], orders[best]
+
 import sys
 if __name__=='__main__':
     if len(sys.argv) > 2 and sys.argv[2] == '-v':
-        intcode7.TRACE=1
+        intcode.setTrace()
 
     if len(sys.argv) < 2:
-        print("Syntax: {} <program file> [-v]".format(sys.argv[0]))
+        print("Syntax: {} <program file> [-v] [--workers=N] [--lockstep]".format(sys.argv[0]))
         sys.exit(1)
 
-    progfile = open(sys.argv[1], 'r')
-
     ## import pdb
     ## pdb.set_trace()
     ## ipc.execute([2,3,0,3,99])
 
-    line = progfile.readline().strip()
-    while line.startswith('#'):
-        ## print (and skip) comments starting with hash
-        print(line)
-        line = progfile.readline().strip()
-
-    inprog = [int(x) for x in line.split(',')]
-    val, seq = maxAmpSequence([0,1,2,3,4], inprog)
+    inprog = intcode.loadProgram(sys.argv[1])
+    workers = int(intcode.optionFromArgs(sys.argv[2:], 'workers', 1))
+    if '--lockstep' in sys.argv[2:]:
+        val, seq = maxAmpSequenceLockstep([0,1,2,3,4], inprog)
+    else:
+        val, seq = maxAmpSequence([0,1,2,3,4], inprog, workers or None)
     print("max = {}\nfrom sequence {}".format(val, seq))
 
 
@@ -40,31 +40,26 @@ Once your Intcode computer is fully functional, the BOOST program should report
 """
 
 ### copy of the day Intcode processor with relative base
-import intcode9
+import intcode
 
 import sys
 if __name__=='__main__':
     if len(sys.argv) > 2 and sys.argv[2] == '-v':
-        intcode9.TRACE=1
+        intcode.setTrace()
 
     if len(sys.argv) < 2:
         print("Syntax: {} <program file> [-v]".format(sys.argv[0]))
         sys.exit(1)
 
-    progfile = open(sys.argv[1], 'r')
-
     if len(sys.argv) > 2 and sys.argv[2] == '--debug':
         import pdb
         pdb.set_trace()
 
-    line = progfile.readline().strip()
-    while line.startswith('#'):
-        ## print (and skip) comments starting with hash
-        print(line)
-        line = progfile.readline().strip()
-
-    inprog = [int(x) for x in line.split(',')]
-    ipc = intcode9.makeIntcodeProcessor()
+    inprog = intcode.loadProgram(sys.argv[1])
+    profile = intcode.optionFromArgs(sys.argv[2:], 'profile')
+    ipc = intcode.makeIntcodeProcessor('profiling' if profile else intcode.engineFromArgs(sys.argv[2:]))
     ipc.execute(inprog)
+    if profile:
+        print(ipc.profile.report(profile))
 
 
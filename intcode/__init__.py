@@ -0,0 +1,28 @@
+"""
+Intcode virtual machine shared by every day that runs Intcode.
+
+The operators live in ops (with an opcode set per puzzle day), memory in memory, the decode-cache machine in
+processor, the threaded and basic-block compiled engines in compiled, the tracing and recording engines in traced
+(with the binary trace format in tracebuf) and the profiling engine in profiler. makeIntcodeProcessor() picks an
+engine, loader reads program files (through a cached binary image of each), network routes packets between machines
+and memo keeps the outputs of whole runs.
+
+The static disassembler (disasm), the NumPy lockstep batch engine (lockstep) and the asyncio machines (aio) are
+imported on their own, so nothing pays for them unless it uses them.
+python -m intcode.bench times every engine on a fixed set of workloads and compares against a saved baseline.
+"""
+from .tracing import trace, setTrace
+from .ops import (REL, IMM, IND, GenericOp, OpAdd, OpMul, OpInput, OpOutput, OpJNZ, OpJZ, OpLT, OpEQ, OpSRB, OpEnd,
+                  DAY2_OPS, DAY5_OPS, DAY5_PART2_OPS, DAY9_OPS, OPCODE_SETS)
+from .memory import Memory, PagedMemory, PAGE_SIZE
+from .processor import (IntcodeProcessor, Suspend, NeedInput, OutputReady, HALTED, NEEDS_INPUT, OUTPUT, PREEMPTED,
+                        CLOCK_SLICE, Snapshot,
+                        getInput, writeOutput)
+from .compiled import ThreadedIntcodeProcessor, BlockIntcodeProcessor, BLOCK_HOT_THRESHOLD, BLOCK_MAX_INSTRUCTIONS
+from .tracebuf import TraceRecorder, readRecords, loadTrace, decodeTrace
+from .traced import TracingIntcodeProcessor, RecordingIntcodeProcessor, instrumentOp
+from .profiler import Profile, ProfilingIntcodeProcessor
+from .loader import loadProgram, parseProgram
+from .network import Packet, Monitor, NatMonitor, Router
+from .memo import RunCache, programDigest
+from .engines import ENGINES, DEFAULT_ENGINE, makeIntcodeProcessor, optionFromArgs, engineFromArgs
@@ -0,0 +1,50 @@
+import sys
+import time
+
+from . import tracing
+from .ops import OPCODE_SETS
+from .engines import makeIntcodeProcessor, engineFromArgs, optionFromArgs
+from .loader import loadProgram
+from .processor import PREEMPTED
+from .tracebuf import TraceRecorder
+from .traced import RecordingIntcodeProcessor
+
+if len(sys.argv) > 2 and sys.argv[2] == '-v':
+    tracing.setTrace()
+
+if len(sys.argv) < 2:
+    print("Syntax: python -m intcode <program file> [-v] [--engine=decode|threaded|block] [--ops={}]"
+          " [--record=<trace file> [--record-size=N]] [--profile=text|json] [--budget=instructions]"
+          " [--timeout=seconds]".format("|".join(OPCODE_SETS)))
+    sys.exit(1)
+
+inprog = loadProgram(sys.argv[1])
+opcodes = OPCODE_SETS[optionFromArgs(sys.argv[2:], 'ops', 'day9')]
+## cap runaway programs: stop after this many instructions and/or seconds
+budget = optionFromArgs(sys.argv[2:], 'budget')
+budget = int(budget) if budget else None
+timeout = optionFromArgs(sys.argv[2:], 'timeout')
+deadline = time.monotonic() + float(timeout) if timeout else None
+record = optionFromArgs(sys.argv[2:], 'record')
+if record:
+    ## keep the last N instructions in a file for python -m intcode.showtrace
+    recorder = TraceRecorder(int(optionFromArgs(sys.argv[2:], 'record-size', 1 << 16)), record)
+    ipc = RecordingIntcodeProcessor(opcodes, recorder=recorder)
+    try:
+        status = ipc.execute(inprog, budget, deadline)
+    finally:
+        recorder.close()
+else:
+    profile = optionFromArgs(sys.argv[2:], 'profile')
+    ipc = makeIntcodeProcessor('profiling' if profile else engineFromArgs(sys.argv[2:]), opcodes=opcodes)
+    status = ipc.execute(inprog, budget, deadline)
+    if profile:
+        print(ipc.profile.report(profile))
+
+if status == PREEMPTED:
+    print("stopped at pc {} after running out of {}".format(ipc.pc, "time" if deadline is not None and
+                                                             time.monotonic() >= deadline else "instructions"))
+
+if tracing.TRACE:
+    print("==result==\nPC={0}".format(ipc.pc))
+    print(ipc.dat.toList())
@@ -0,0 +1,59 @@
+"""
+Intcode machines on an asyncio event loop: input instructions await an inbox channel and output instructions await
+an outbox channel (asyncio.Queue, bounded ones give backpressure), so any number of machines wired into rings or
+networks run concurrently in one process.
+
+A machine runs its engine with run_until_io() between awaits, in slices of at most ASYNC_SLICE instructions, so a
+long stretch of computing without I/O still lets the other machines have a turn.
+"""
+import asyncio
+
+from .ops import DAY9_OPS
+from .processor import HALTED, NEEDS_INPUT, PREEMPTED
+from .engines import DEFAULT_ENGINE, makeIntcodeProcessor
+
+## instructions a machine runs before giving the event loop back, if it has not waited on a channel in between
+ASYNC_SLICE = 10000
+
+class AsyncIntcodeMachine:
+    """
+    program started on a machine of the given engine, reading from inbox and writing to outbox (new unbounded
+    queues unless given), with inputs queued before anything arrives on the inbox. await run() until it halts.
+    """
+    def __init__(self, program, inbox=None, outbox=None, inputs=(), engine=DEFAULT_ENGINE, opcodes=DAY9_OPS):
+        self.ipc = makeIntcodeProcessor(engine, opcodes=opcodes)
+        self.ipc.start(program, inputs)
+        self.inbox = inbox if inbox is not None else asyncio.Queue()
+        self.outbox = outbox if outbox is not None else asyncio.Queue()
+        self.last_output = None
+
+    async def run(self):
+        """run until the program ends, returning the last value it output"""
+        ipc = self.ipc
+        while True:
+            status, outputs = ipc.run_until_io(stop_on_output=True, budget=ASYNC_SLICE)
+            for value in outputs:
+                self.last_output = value
+                await self.outbox.put(value)
+            if status == HALTED:
+                return self.last_output
+            if status == NEEDS_INPUT:
+                ipc.send(await self.inbox.get())
+                while not self.inbox.empty():
+                    ipc.send(self.inbox.get_nowait())
+            elif status == PREEMPTED:
+                await asyncio.sleep(0)
+
+def ring(programs, inputs=None, maxsize=0, engine=DEFAULT_ENGINE, opcodes=DAY9_OPS):
+    """
+    machines connected in a ring, each one's outbox the next one's inbox (queues of maxsize, 0 for unbounded);
+    inputs, if given, holds the initial inputs for each machine
+    """
+    channels = [asyncio.Queue(maxsize) for _ in programs]
+    inputs = inputs if inputs is not None else [()] * len(programs)
+    return [AsyncIntcodeMachine(program, channels[i], channels[(i + 1) % len(programs)], inputs[i], engine, opcodes)
+            for i, program in enumerate(programs)]
+
+async def runAll(machines):
+    """run machines concurrently until every one has halted, returning their last outputs"""
+    return await asyncio.gather(*[machine.run() for machine in machines])
@@ -0,0 +1,222 @@
+"""
+Benchmark suite: a fixed set of workloads built from the puzzle inputs, run on every engine, timed (best of a few
+repeats) and measured for instructions per second, peak traced memory and the memory blocks the run allocated that it
+still holds at the end (CPython keeps no running count of every allocation, so what leaks or piles up in caches is
+what shows). Results can be saved as JSON and compared against a saved baseline, failing when anything got slower
+than the threshold allows.
+
+    python -m intcode.bench [--engines=block,threaded] [--workloads=day9-boost] [--repeat=3] [--json=results.json]
+                            [--baseline=results.json [--threshold=0.10]] [--data=<directory with the inputs>]
+"""
+import gc
+import itertools
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+
+from .ops import DAY5_PART2_OPS, DAY9_OPS
+from .processor import HALTED
+from .engines import ENGINES, makeIntcodeProcessor, optionFromArgs
+from .loader import loadProgram
+
+## the tracing engine prints every instruction, so timing it would time the terminal
+BENCH_ENGINES = [engine for engine in ENGINES if engine != 'traced']
+DATA_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+class Machines:
+    """
+    makes the machines for one workload run on one engine; with keep it holds on to them so their instructions can
+    be counted afterwards (which would skew the memory figures otherwise)
+    """
+    def __init__(self, engine, keep=False):
+        self.engine = engine
+        self.keep = keep
+        self.made = []
+
+    def __call__(self, opcodes=DAY9_OPS):
+        ipc = makeIntcodeProcessor(self.engine, opcodes=opcodes, traced=False)
+        if self.keep:
+            self.made.append(ipc)
+        return ipc
+
+def runToEnd(ipc, program, inputs):
+    ipc.start(program, inputs)
+    status, outputs = ipc.run_until_io()
+    assert status == HALTED, status
+    return outputs
+
+def day9Boost(make, data):
+    """day 9 part 2: a long-running recursive computation"""
+    return runToEnd(make(), data['day9-input.txt'], [2])[-1]
+
+def day9SelfTest(make, data):
+    """day 9 part 1: the opcode self-test, mostly straight-line code run once"""
+    return runToEnd(make(), data['day9-input.txt'], [1])[-1]
+
+def day11Robot(make, data):
+    """day 11: the hull painting robot, an input and two outputs per step"""
+    ipc = make()
+    ipc.start(data['day11-input.txt'])
+    panels = {}
+    pos, direction = (0, 0), (0, -1)
+    while True:
+        ipc.send(panels.get(pos, 0))
+        status, outputs = ipc.run_until_io()
+        for paint, turn in zip(outputs[::2], outputs[1::2]):
+            panels[pos] = paint
+            direction = (-direction[1], direction[0]) if turn else (direction[1], -direction[0])
+            pos = (pos[0] + direction[0], pos[1] + direction[1])
+        if status == HALTED:
+            return len(panels)
+
+def day7Feedback(make, data):
+    """day 7 part 2: every phase order round the amplifier feedback loop, 600 short-lived machines"""
+    program = data['day7-input.txt']
+    best = 0
+    for order in itertools.permutations(range(5, 10)):
+        amps = [make(DAY5_PART2_OPS) for _ in order]
+        for amp, phase in zip(amps, order):
+            amp.start(program, [phase])
+        amps[0].send(0)
+        signal = None
+        while not all(amp.halted for amp in amps):
+            for i, amp in enumerate(amps):
+                _, outputs = amp.run_until_io()
+                amps[(i + 1) % len(amps)].send(*outputs)
+                if outputs and i == len(amps) - 1:
+                    signal = outputs[-1]
+        best = max(best, signal)
+    return best
+
+def day5Compare(make, data):
+    """day 5 part 2's larger example, a handful of instructions run 1000 times: load and start-up cost"""
+    program = data['day5-part2-exlrg.txt']
+    return sum(runToEnd(make(DAY5_PART2_OPS), program, [7 + n % 3])[-1] for n in range(1000))
+
+## name -> (function, the input files it needs)
+WORKLOADS = {
+    'day9-boost': (day9Boost, ['day9-input.txt']),
+    'day9-selftest': (day9SelfTest, ['day9-input.txt']),
+    'day11-robot': (day11Robot, ['day11-input.txt']),
+    'day7-feedback': (day7Feedback, ['day7-input.txt']),
+    'day5-compare': (day5Compare, ['day5-part2-exlrg.txt']),
+}
+
+def loadData(names, directory=DATA_DIR):
+    return dict((name, loadProgram(os.path.join(directory, name), echo=None)) for name in names)
+
+def countInstructions(workload, data):
+    """how many instructions a workload runs, counted on the profiling engine"""
+    make = Machines('profiling', keep=True)
+    workload(make, data)
+    return sum(ipc.profile.instructions() for ipc in make.made)
+
+def measure(workload, engine, data, instructions, repeat=3):
+    """
+    time the workload on an engine (best of repeat runs), then run it once more under tracemalloc for its peak and
+    the blocks it allocated that are still held once it is done
+    """
+    best = None
+    result = None
+    for _ in range(repeat):
+        gc.collect()
+        started = time.perf_counter()
+        result = workload(Machines(engine), data)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    gc.collect()
+    tracemalloc.start()
+    try:
+        workload(Machines(engine), data)
+        gc.collect()
+        held = tracemalloc.take_snapshot().filter_traces([tracemalloc.Filter(False, tracemalloc.__file__)])
+        _, peak = tracemalloc.get_traced_memory()
+        held = held.statistics('filename')
+    finally:
+        tracemalloc.stop()
+    return {
+        'result': result,
+        'seconds': best,
+        'instructions': instructions,
+        'instructions_per_second': instructions / best if best else 0,
+        'peak_bytes': peak,
+        'blocks_retained': sum(stat.count for stat in held),
+        'bytes_retained': sum(stat.size for stat in held),
+    }
+
+def runSuite(engines=BENCH_ENGINES, workloads=WORKLOADS, repeat=3, directory=DATA_DIR, log=print):
+    """every workload on every engine; the results agree across engines or something is broken"""
+    results = {}
+    for name in workloads:
+        workload, files = WORKLOADS[name]
+        data = loadData(files, directory)
+        instructions = countInstructions(workload, data)
+        results[name] = {}
+        for engine in engines:
+            results[name][engine] = measure(workload, engine, data, instructions, repeat)
+            if log:
+                log(formatRow(name, engine, results[name][engine]))
+        answers = set(repr(r['result']) for r in results[name].values())
+        if len(answers) > 1:
+            raise AssertionError("engines disagree on {}: {}".format(name, sorted(answers)))
+    return {
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'machine': platform.machine(),
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'repeat': repeat,
+        'results': results,
+    }
+
+def formatRow(workload, engine, r):
+    return "{:<14} {:<10} {:>9.4f}s {:>12.0f} instr/s {:>10} instr {:>9.1f} KiB peak {:>7} blocks retained".format(
+        workload, engine, r['seconds'], r['instructions_per_second'], r['instructions'], r['peak_bytes'] / 1024,
+        r['blocks_retained'])
+
+def compare(results, baseline, threshold=0.10):
+    """
+    (workload, engine, baseline seconds, seconds, change) for each pair timed in both, and the ones slower than the
+    baseline by more than threshold (a fraction)
+    """
+    changes = []
+    for name, engines in results['results'].items():
+        for engine, r in engines.items():
+            old = baseline.get('results', {}).get(name, {}).get(engine)
+            if old is None or not old['seconds']:
+                continue
+            changes.append((name, engine, old['seconds'], r['seconds'], r['seconds'] / old['seconds'] - 1))
+    return changes, [c for c in changes if c[-1] > threshold]
+
+if __name__=='__main__':
+    argv = sys.argv[1:]
+    engines = optionFromArgs(argv, 'engines')
+    engines = engines.split(',') if engines else BENCH_ENGINES
+    workloads = optionFromArgs(argv, 'workloads')
+    workloads = workloads.split(',') if workloads else list(WORKLOADS)
+    for name in [e for e in engines if e not in ENGINES] + [w for w in workloads if w not in WORKLOADS]:
+        print("unknown engine or workload {}; engines: {}; workloads: {}".format(
+            name, ",".join(ENGINES), ",".join(WORKLOADS)))
+        sys.exit(2)
+
+    results = runSuite(engines, workloads, int(optionFromArgs(argv, 'repeat', 3)),
+                       optionFromArgs(argv, 'data', DATA_DIR))
+    output = optionFromArgs(argv, 'json')
+    if output:
+        with open(output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    baseline = optionFromArgs(argv, 'baseline')
+    if baseline:
+        with open(baseline) as f:
+            baseline = json.load(f)
+        threshold = float(optionFromArgs(argv, 'threshold', 0.10))
+        changes, regressions = compare(results, baseline, threshold)
+        print("against {} (threshold {:+.0%}):".format(optionFromArgs(argv, 'baseline'), threshold))
+        for name, engine, old, new, change in changes:
+            mark = "  REGRESSION" if change > threshold else ""
+            print("{:<14} {:<10} {:>9.4f}s -> {:>9.4f}s {:+7.1%}{}".format(name, engine, old, new, change, mark))
+        if regressions:
+            sys.exit(1)
@@ -0,0 +1,446 @@
+import collections
+import functools
+import re
+import threading
+
+from .memory import Memory
+from .ops import OpAdd, OpLT, OpEQ, OpJNZ, OpJZ
+from .processor import (IntcodeProcessor, Suspend, HALTED, FETCH_LIT, FETCH_DEREF, FETCH_RDEREF, FETCH_RADDR,
+                        FETCH_WORD, FETCH_FORWARD)
+
+## source for each fetch kind when a parameter is baked into generated code
+## reads index the contiguous words directly when the address is in range, and go through Memory otherwise
+read_source = {
+    FETCH_LIT: "{0}",
+    FETCH_WORD: "words[{0}]",
+    FETCH_DEREF: "(words[{0}] if 0 <= {0} < len(words) else dat[{0}])",
+    FETCH_RDEREF: "(words[_a] if 0 <= (_a := {0} + rb) < len(words) else dat[_a])",
+    FETCH_RADDR: "({0} + rb)",
+    FETCH_FORWARD: "_s",
+}
+address_source = {
+    FETCH_LIT: "{0}",
+    FETCH_WORD: "{0}",
+    FETCH_RADDR: "({0} + rb)",
+}
+
+def specialise(fetch, outputs, size):
+    """mark literal addresses below size (which the contiguous words never shrink under) as FETCH_WORD"""
+    result = []
+    for i, (kind, value) in enumerate(fetch):
+        if 0 <= value < size and (kind == FETCH_DEREF or (kind == FETCH_LIT and i in outputs)):
+            kind = FETCH_WORD
+        result.append((kind, value))
+    return tuple(result)
+
+def forwardStores(instructions):
+    """
+    turn reads of the literal address the previous instruction has just stored to into FETCH_FORWARD, so generated
+    code uses the stored value (kept in _s) instead of loading it back; returns the rewritten (pc, entry) pairs
+    """
+    result = []
+    stored = None
+    for pc, (op, fetch, outputs, length) in instructions:
+        if stored is not None:
+            fetch = tuple((FETCH_FORWARD, value) if kind == FETCH_WORD and value == stored and i not in outputs
+                          else (kind, value) for i, (kind, value) in enumerate(fetch))
+        result.append((pc, (op, fetch, outputs, length)))
+        stored = None
+        if outputs and fetch[outputs[0]][0] == FETCH_WORD:
+            stored = fetch[outputs[0]][1]
+    return tuple(result)
+
+def instructionSource(op, kinds, operands, outputs):
+    """
+    Python source lines for one instruction, plus the expressions for the addresses it writes.
+
+    A line of the form "{out} = <expr>" stores into the operator's output parameter; a store to a literal address
+    also leaves the value in _s for a following FETCH_FORWARD read.
+    """
+    exprs = [read_source[k].format(o) for k, o in zip(kinds, operands)]
+    lines = []
+    written = []
+    for line in op.EMIT:
+        if line.startswith("{out} = "):
+            i = outputs[0]
+            value = line[len("{out} = "):].format(*exprs)
+            if kinds[i] == FETCH_WORD:
+                lines.append("words[{}] = _s = {}".format(operands[i], value))
+                written.append(operands[i])
+            else:
+                lines.append("_v = {}".format(value))
+                lines.append("_w = {}".format(address_source[kinds[i]].format(operands[i])))
+                lines.append("if 0 <= _w < len(words): words[_w] = _v")
+                lines.append("else: dat[_w] = _v")
+                written.append("_w")
+        else:
+            lines.append(line.format(*exprs))
+    return lines, written
+
+## superinstructions: operator sequences the threaded engine runs as one step, when each instruction after the
+## first reads the value the one before it stored (a compare feeding a jump, a counter bump feeding a loop test)
+COMPARES = (OpLT.OPC, OpEQ.OPC)
+JUMPS = (OpJNZ.OPC, OpJZ.OPC)
+FUSE_PATTERNS = [
+    ((OpAdd.OPC,), COMPARES, JUMPS),
+    (COMPARES, JUMPS),
+]
+
+_step_factories = {}
+def makeStepFactory(parts):
+    """
+    Build (once per operator and mode combination) a factory that bakes operands into a step closure.
+
+    parts is a sequence of (operator, fetch kinds, output indices, length): a single instruction, or a fused
+    superinstruction. The closure runs them and returns the next pc, so the dispatch loop makes a single call per
+    step. A write into translated code part way through a superinstruction stops it after the writing instruction.
+    """
+    key = tuple((op, kinds) for op, kinds, _, _ in parts)
+    if key in _step_factories:
+        return _step_factories[key]
+    names = []
+    body = []
+    offset = 0
+    for n, (op, kinds, outputs, length) in enumerate(parts):
+        operands = ["p{}_{}".format(n, i) for i in range(len(kinds))]
+        names.extend(operands)
+        lines, written = instructionSource(op, kinds, operands, outputs)
+        body.extend(lines)
+        offset += length
+        for addr in written:
+            if n == len(parts) - 1:
+                body.append("if {0} in covered: proc.invalidate({0})".format(addr))
+            else:
+                body.append("if {0} in covered:".format(addr))
+                body.append("    proc.invalidate({})".format(addr))
+                body.append("    return pc + {}".format(offset))
+    body.append("return nextpc")
+    src = "def factory(proc, dat, words, covered, pc, nextpc{}):\n".format("".join(", " + n for n in names))
+    src += "    def step():\n"
+    if any(re.search(r"\brb\b", line) for line in body):
+        src += "        rb = proc.relative_base\n"
+    src += "".join("        {}\n".format(line) for line in body)
+    src += "    return step\n"
+    namespace = {}
+    label = " ".join("{} {}".format(op.__name__, kinds) for op, kinds in key)
+    exec(compile(src, "<intcode {}>".format(label), "exec"), globals(), namespace)
+    _step_factories[key] = namespace["factory"]
+    return namespace["factory"]
+
+class ThreadedIntcodeProcessor(IntcodeProcessor):
+    """
+    Threaded-code engine: each instruction is translated into a closure with its modes and operands baked in.
+
+    Translations live in the same PC-keyed cache as the decoded instructions and are dropped the same way when
+    the program overwrites them.
+    """
+    def newMemory(self, program):
+        # generated code indexes and stores into the words directly, so they have to stay python ints
+        return Memory(program, compact=False)
+
+    def forkCaches(self):
+        # the closures are bound to this machine, a fork has to translate its own
+        return ({}, frozenset())
+
+    ## the closures and dispatch loops hold on to decoded and covered, so snapshots copy them rather than share them
+    ## (the contiguous words are copied too, so this costs no more than the memory does)
+    def saveCaches(self):
+        return (dict(self.decoded), frozenset(self.covered))
+
+    def restoreCaches(self, caches):
+        decoded, covered = caches
+        self.decoded.clear()
+        self.decoded.update(decoded)
+        self.covered.clear()
+        self.covered.update(covered)
+
+    def resetCaches(self):
+        self.decoded.clear()
+        self.covered.clear()
+
+    def fuse(self, pc, entry):
+        """
+        the superinstruction starting with the decoded entry at pc, as specialised (pc, entry) pairs, or None
+
+        Only the fused step is cached at pc, so a jump into the middle of the sequence still lands on (and
+        translates) the single instruction there.
+        """
+        for pattern in FUSE_PATTERNS:
+            if entry[0].OPC not in pattern[0]:
+                continue
+            instructions = [(pc, entry)]
+            at = pc + entry[-1]
+            try:
+                for opcodes in pattern[1:]:
+                    if self.dat[at] % 100 not in opcodes:
+                        break
+                    instructions.append((at, self.decode(at)))
+                    at += instructions[-1][1][-1]
+            except (KeyError, AssertionError):
+                continue
+            if len(instructions) < len(pattern):
+                continue
+            size = len(self.dat.words)
+            instructions = forwardStores((at, (op, specialise(fetch, outputs, size), outputs, length))
+                                         for at, (op, fetch, outputs, length) in instructions)
+            if all(FETCH_FORWARD in [k for k, _ in e[1]] for _, e in instructions[1:]):
+                return instructions
+        return None
+
+    def translate(self, pc):
+        entry = self.decode(pc)
+        op, fetch, outputs, length = entry
+        if hasattr(op, 'EMIT'):
+            instructions = self.fuse(pc, entry) or ((pc, (op, specialise(fetch, outputs, len(self.dat.words)),
+                                                          outputs, length)),)
+            parts = [(op, tuple(k for k, _ in fetch), outputs, length) for _, (op, fetch, outputs, length) in instructions]
+            length = sum(p[-1] for p in parts)
+            factory = makeStepFactory(tuple(parts))
+            step = factory(self, self.dat, self.dat.words, self.covered, pc, pc + length,
+                           *[v for _, (_, fetch, _, _) in instructions for _, v in fetch])
+            step.instructions = len(parts)
+        else:
+            # no source template, so wrap the generic decoded path
+            step = functools.partial(self.run_decoded, pc, entry)
+            step.instructions = 1
+        return self.cache(pc, (step, length))
+
+    def run(self, budget=None, deadline=None):
+        if budget is not None or deadline is not None:
+            return self.runBudgeted(budget, deadline)
+        decoded = self.decoded
+        pc = self.pc
+        try:
+            while True:
+                entry = decoded.get(pc)
+                if entry is None:
+                    entry = self.translate(pc)
+                pc = entry[0]()
+        except StopIteration as stop:
+            self.pc = pc if stop.value is None else stop.value
+            self.halted = True
+            return HALTED
+        except Suspend:
+            self.pc = pc
+            raise
+
+    def runFor(self, count):
+        """
+        the run() loop, counting every instruction a fused step runs; a step that would take it past count is run
+        an instruction at a time instead, so it stops on exactly count like the decode engine
+        """
+        decoded = self.decoded
+        pc = self.pc
+        ran = 0
+        try:
+            while ran < count:
+                entry = decoded.get(pc)
+                if entry is None:
+                    entry = self.translate(pc)
+                step = entry[0]
+                if ran + step.instructions > count:
+                    pc = self.run_decoded(pc, self.decode(pc))
+                    ran += 1
+                    continue
+                pc = step()
+                ran += step.instructions
+        except StopIteration as stop:
+            pc = pc if stop.value is None else stop.value
+            self.halted = True
+        except Suspend:
+            self.pc = pc
+            raise
+        self.pc = pc
+        return ran
+
+## number of times the dispatch loop must land on a pc before a block is compiled from there
+BLOCK_HOT_THRESHOLD = 16
+## longest straight-line run (in instructions) put into one block
+BLOCK_MAX_INSTRUCTIONS = 64
+## compiled block factories kept, least recently used dropped first
+BLOCK_FACTORY_LIMIT = 1024
+
+_block_factories = collections.OrderedDict()
+## machines may compile blocks from several threads at once, and a lookup must not see its key evicted half way
+_block_factories_lock = threading.Lock()
+def makeBlockFactory(start, instructions, words):
+    """
+    Emit Python source for a straight-line block with all operands inlined and compile it once.
+
+    Factories are keyed by the start pc, the memory words the block covers and the specialised fetch kinds, so any
+    processor running the same code (or the same code again after it was overwritten and restored) reuses the
+    compiled block. Compiling happens outside the lock, so two threads may both compile a block; the later one wins.
+    """
+    key = (start, words, tuple(fetch for _, (_, fetch, _, _) in instructions))
+    with _block_factories_lock:
+        factory = _block_factories.get(key)
+        if factory is not None:
+            _block_factories.move_to_end(key)
+            return factory
+    body = []
+    for pc, (op, fetch, outputs, length) in instructions:
+        lines, written = instructionSource(op, [k for k, _ in fetch], [repr(v) for _, v in fetch], outputs)
+        if any(re.search(r"\bpc\b", line) for line in lines):
+            body.append("pc = {}".format(pc))
+        body.extend(lines)
+        for addr in written:
+            # a write into any compiled code ends the block, the rest of it may now be stale
+            body.append("if {0} in covered:".format(addr))
+            body.append("    proc.invalidate({})".format(addr))
+            body.append("    return {}".format(pc + length))
+    last_pc, last = instructions[-1]
+    body.append("return {}".format(last_pc + last[-1]))
+    src = "def factory(proc, dat, words, covered):\n"
+    src += "    def block():\n"
+    src += "        rb = proc.relative_base\n"
+    src += "".join("        {}\n".format(line) for line in body)
+    src += "    return block\n"
+    namespace = {}
+    exec(compile(src, "<intcode block @{}>".format(start), "exec"), globals(), namespace)
+    with _block_factories_lock:
+        _block_factories[key] = namespace["factory"]
+        if len(_block_factories) > BLOCK_FACTORY_LIMIT:
+            _block_factories.popitem(last=False)
+    return namespace["factory"]
+
+class BlockIntcodeProcessor(ThreadedIntcodeProcessor):
+    """
+    Basic-block JIT: once a pc gets hot, the straight-line run starting there (up to the next jump or end, or up to
+    but not including the next input or output) is emitted as a single Python function. Colder code runs on the
+    threaded closures.
+
+    Writes into a compiled range drop the block; it is rebuilt (or fetched from the factory cache) if it gets hot
+    again, after twice as many landings as the last time, so code that keeps rewriting itself mostly stays threaded.
+    """
+    def compileBlock(self, start):
+        instructions = []
+        pc = start
+        while len(instructions) < BLOCK_MAX_INSTRUCTIONS:
+            try:
+                entry = self.decode(pc)
+            except (KeyError, AssertionError):
+                if not instructions:
+                    raise
+                # not an instruction (yet): self-modifying code may write one there before it gets that far
+                break
+            op = entry[0]
+            if not hasattr(op, 'EMIT') or getattr(op, 'SUSPENDS', False):
+                break
+            instructions.append((pc, entry))
+            pc += entry[-1]
+            if getattr(op, 'BLOCK_END', False):
+                break
+        if not instructions:
+            # nothing compilable here, the closure stands in as a one-instruction block
+            block, length = self.decoded.get(start) or self.translate(start)
+            self.blocks[start] = block
+            for a in range(start, start + length):
+                self.block_owners[a].add(start)
+            return block
+        words = tuple(self.dat[a] for a in range(start, pc))
+        size = len(self.dat.words)
+        instructions = forwardStores((ipc, (op, specialise(fetch, outputs, size), outputs, length))
+                                     for ipc, (op, fetch, outputs, length) in instructions)
+        block = makeBlockFactory(start, instructions, words)(self, self.dat, self.dat.words, self.covered)
+        block.instructions = len(instructions)
+        self.blocks[start] = block
+        self.covered.update(range(start, pc))
+        for a in range(start, pc):
+            self.block_owners[a].add(start)
+        return block
+
+    def invalidate(self, addr):
+        ThreadedIntcodeProcessor.invalidate(self, addr)
+        for start in self.block_owners.pop(addr, ()):
+            if start in self.blocks:
+                del self.blocks[start]
+                n = self.rebuilds.get(start, 0) + 1
+                self.rebuilds[start] = n
+                self.heat[start] = BLOCK_HOT_THRESHOLD - (BLOCK_HOT_THRESHOLD << n)
+
+    def load(self, program):
+        ThreadedIntcodeProcessor.load(self, program)
+        self.blocks = {}
+        self.block_owners = collections.defaultdict(set)
+        self.heat = {}
+        self.rebuilds = {} # start pc -> times its block has been dropped
+
+    def restoreCaches(self, caches):
+        # blocks are cheap to rebuild from the shared factories, so they are not kept in snapshots
+        ThreadedIntcodeProcessor.restoreCaches(self, caches)
+        self.blocks.clear()
+        self.block_owners.clear()
+        self.heat.clear()
+        self.rebuilds.clear()
+
+    def resetCaches(self):
+        ThreadedIntcodeProcessor.resetCaches(self)
+        self.blocks.clear()
+        self.block_owners.clear()
+        self.heat.clear()
+        self.rebuilds.clear()
+
+    def run(self, budget=None, deadline=None):
+        if budget is not None or deadline is not None:
+            return self.runBudgeted(budget, deadline)
+        decoded = self.decoded
+        blocks = self.blocks
+        heat = self.heat
+        pc = self.pc
+        try:
+            while True:
+                block = blocks.get(pc)
+                if block is not None:
+                    pc = block()
+                    continue
+                n = heat.get(pc, 0) + 1
+                heat[pc] = n
+                if n >= BLOCK_HOT_THRESHOLD:
+                    pc = self.compileBlock(pc)()
+                    continue
+                entry = decoded.get(pc)
+                if entry is None:
+                    entry = self.translate(pc)
+                pc = entry[0]()
+        except StopIteration as stop:
+            self.pc = pc if stop.value is None else stop.value
+            self.halted = True
+            return HALTED
+        except Suspend:
+            self.pc = pc
+            raise
+
+    def runFor(self, count):
+        """the run() loop, counting instructions a block at a time; the last few before count run one by one"""
+        decoded = self.decoded
+        blocks = self.blocks
+        heat = self.heat
+        pc = self.pc
+        ran = 0
+        try:
+            while ran < count:
+                block = blocks.get(pc)
+                if block is None:
+                    n = heat.get(pc, 0) + 1
+                    heat[pc] = n
+                    if n >= BLOCK_HOT_THRESHOLD:
+                        block = self.compileBlock(pc)
+                    else:
+                        entry = decoded.get(pc)
+                        if entry is None:
+                            entry = self.translate(pc)
+                        block = entry[0]
+                if ran + block.instructions > count:
+                    pc = self.run_decoded(pc, self.decode(pc))
+                    ran += 1
+                    continue
+                pc = block()
+                ran += block.instructions
+        except StopIteration as stop:
+            pc = pc if stop.value is None else stop.value
+            self.halted = True
+        except Suspend:
+            self.pc = pc
+            raise
+        self.pc = pc
+        return ran
@@ -0,0 +1,221 @@
+"""
+Static disassembler: follows the paths reachable from the entry points of a program image, splits them into basic
+blocks and builds the control-flow graph, as a listing, DOT or JSON.
+
+Anything not reached is listed as data. Jumps through memory have no static target; the usual call idiom (a return
+address stored as a constant right before a jump to the routine) is followed so the code after calls is found too.
+"""
+import collections
+import json
+
+from .ops import REL, IMM, IND, OpAdd, OpMul, OpJNZ, OpJZ, OpEnd, DAY9_OPS, opName
+
+Instruction = collections.namedtuple('Instruction', 'pc op modes operands length')
+BasicBlock = collections.namedtuple('BasicBlock', 'start end instructions successors')
+
+## control-flow edge kinds
+FALL = 'fall'         # on to the next instruction (or not taking a conditional jump)
+JUMP = 'jump'         # to a jump's literal target
+INDIRECT = 'indirect' # to wherever a jump through memory goes, unknown statically
+
+JUMPS = (OpJNZ.OPC, OpJZ.OPC)
+
+def decodeAt(program, pc, ops):
+    """the instruction at pc, or None if the words there do not make one"""
+    if not 0 <= pc < len(program):
+        return None
+    op = ops.get(program[pc] % 100)
+    if op is None or pc + len(op.PARAM) >= len(program):
+        return None
+    modes = []
+    pmask = program[pc] // 100
+    for e in op.PARAM:
+        mode = pmask % 10
+        if mode not in (REL, IMM, IND) or (e == IND and mode == IMM):
+            return None
+        modes.append(mode)
+        pmask //= 10
+    if pmask:
+        return None
+    return Instruction(pc, op, tuple(modes), tuple(program[pc + 1:pc + 1 + len(op.PARAM)]), 1 + len(op.PARAM))
+
+def successors(instruction):
+    """(kind, target pc) for each way control leaves the instruction; INDIRECT edges have target None"""
+    pc, op, modes, operands, length = instruction
+    if op.OPC == OpEnd.OPC:
+        return []
+    if op.OPC not in JUMPS:
+        return [(FALL, pc + length)]
+    edges = []
+    always = modes[0] == IMM and bool(operands[0]) == (op.OPC == OpJNZ.OPC)
+    never = modes[0] == IMM and not always
+    if not always:
+        edges.append((FALL, pc + length))
+    if not never:
+        edges.append((JUMP, operands[1]) if modes[1] == IMM else (INDIRECT, None))
+    return edges
+
+def formatOperand(mode, value):
+    if mode == IMM:
+        return str(value)
+    if mode == REL:
+        return "[rb{:+d}]".format(value)
+    return "[{}]".format(value)
+
+def formatInstruction(instruction):
+    pc, op, modes, operands, length = instruction
+    reads = [formatOperand(m, v) for m, v, e in zip(modes, operands, op.PARAM) if e == IMM]
+    writes = [formatOperand(m, v) for m, v, e in zip(modes, operands, op.PARAM) if e == IND]
+    text = opName(op)
+    if reads:
+        text += " " + ", ".join(reads)
+    if writes:
+        text += " -> " + ", ".join(writes)
+    return text
+
+class Disassembly:
+    def __init__(self, program, opcodes=DAY9_OPS, roots=(0,), follow_calls=True):
+        self.program = list(program)
+        self.ops = dict([(op.OPC, op) for op in opcodes])
+        self.instructions = {}
+        self.entries = set(roots) # where control can arrive from outside a straight path: roots and call returns
+        self.indirect = set()     # pcs of jumps through memory
+        self.trace(list(roots), follow_calls)
+        self.covered = set(a for i in self.instructions.values() for a in range(i.pc, i.pc + i.length))
+        self.blocks = self.buildBlocks()
+
+    def trace(self, pending, follow_calls):
+        """walk every path from the pending entry points, decoding as we go"""
+        while pending:
+            pc = pending.pop()
+            while pc not in self.instructions:
+                instruction = decodeAt(self.program, pc, self.ops)
+                if instruction is None:
+                    break
+                self.instructions[pc] = instruction
+                edges = successors(instruction)
+                for kind, target in edges:
+                    if kind == JUMP:
+                        pending.append(target)
+                    elif kind == INDIRECT:
+                        self.indirect.add(pc)
+                if follow_calls:
+                    for target in self.returnAddress(instruction):
+                        self.entries.add(target)
+                        pending.append(target)
+                if not any(kind == FALL for kind, _ in edges):
+                    break
+                pc += instruction.length
+
+    def returnAddress(self, instruction):
+        """a constant stored right before a jump, naming the address just past that jump, is where a call returns"""
+        pc, op, modes, operands, length = instruction
+        if op.OPC not in (OpAdd.OPC, OpMul.OPC) or modes[:2] != (IMM, IMM):
+            return []
+        value = operands[0] + operands[1] if op.OPC == OpAdd.OPC else operands[0] * operands[1]
+        jump = decodeAt(self.program, pc + length, self.ops)
+        if jump is not None and jump.op.OPC in JUMPS and value == jump.pc + jump.length:
+            return [value]
+        return []
+
+    def buildBlocks(self):
+        leaders = set(self.entries)
+        for instruction in self.instructions.values():
+            edges = successors(instruction)
+            if any(kind != FALL for kind, _ in edges) or not edges:
+                leaders.add(instruction.pc + instruction.length)
+            leaders.update(target for kind, target in edges if kind == JUMP)
+        blocks = {}
+        for start in sorted(pc for pc in leaders if pc in self.instructions):
+            pc = start
+            instructions = []
+            while True:
+                instruction = self.instructions[pc]
+                instructions.append(instruction)
+                pc += instruction.length
+                if pc in leaders or pc not in self.instructions or not any(
+                        kind == FALL for kind, _ in successors(instruction)):
+                    break
+            last = instructions[-1]
+            blocks[start] = BasicBlock(start, pc, tuple(instructions), tuple(successors(last)))
+        return blocks
+
+    def listing(self):
+        lines = []
+        pc = 0
+        data = []
+        def flushData():
+            for n in range(0, len(data), 8):
+                chunk = data[n:n + 8]
+                lines.append("{:>6}  DATA {}".format(chunk[0][0], ", ".join(str(v) for _, v in chunk)))
+            del data[:]
+        while pc < len(self.program):
+            instruction = self.instructions.get(pc)
+            if instruction is None:
+                data.append((pc, self.program[pc]))
+                pc += 1
+                continue
+            flushData()
+            if pc in self.blocks:
+                block = self.blocks[pc]
+                exits = ", ".join("{} {}".format(kind, "?" if target is None else target)
+                                  for kind, target in block.successors) or "halt"
+                lines.append("")
+                lines.append("block_{}:    ; -> {}".format(pc, exits))
+            words = ",".join(str(w) for w in self.program[pc:pc + instruction.length])
+            lines.append("{:>6}  {:<32} {}".format(pc, words, formatInstruction(instruction)))
+            pc += instruction.length
+        flushData()
+        return "\n".join(lines)
+
+    def toDict(self):
+        return {
+            'instructions': [{'pc': i.pc, 'op': opName(i.op), 'modes': list(i.modes), 'operands': list(i.operands),
+                              'length': i.length, 'text': formatInstruction(i)}
+                             for i in sorted(self.instructions.values())],
+            'blocks': [{'start': b.start, 'end': b.end,
+                        'successors': [{'kind': kind, 'target': target} for kind, target in b.successors]}
+                       for b in sorted(self.blocks.values())],
+            'data': [pc for pc in range(len(self.program)) if pc not in self.covered],
+        }
+
+    def toJSON(self):
+        return json.dumps(self.toDict(), indent=2)
+
+    def toDot(self):
+        lines = ["digraph intcode {", '    node [shape=box fontname="monospace"];']
+        if self.indirect:
+            lines.append('    indirect [shape=ellipse label="?"];')
+        for block in sorted(self.blocks.values()):
+            label = "\\l".join("{}: {}".format(i.pc, formatInstruction(i)) for i in block.instructions) + "\\l"
+            lines.append('    b{} [label="{}"];'.format(block.start, label.replace('"', '\\"')))
+            for kind, target in block.successors:
+                if target is None:
+                    lines.append('    b{} -> indirect [style=dashed];'.format(block.start))
+                elif target in self.blocks:
+                    lines.append('    b{} -> b{} [label="{}"];'.format(block.start, target, kind))
+        lines.append("}")
+        return "\n".join(lines)
+
+if __name__=='__main__':
+    import sys
+    from .ops import OPCODE_SETS
+    from .engines import optionFromArgs
+    from .loader import loadProgram
+
+    if len(sys.argv) < 2:
+        print("Syntax: python -m intcode.disasm <program file> [--format=listing|dot|json] [--ops={}]"
+              " [--entry=pc,pc...]".format("|".join(OPCODE_SETS)))
+        sys.exit(1)
+
+    inprog = loadProgram(sys.argv[1], echo=None)
+
+    roots = [int(pc) for pc in optionFromArgs(sys.argv[2:], 'entry', '0').split(',')]
+    dis = Disassembly(inprog, OPCODE_SETS[optionFromArgs(sys.argv[2:], 'ops', 'day9')], roots)
+    format = optionFromArgs(sys.argv[2:], 'format', 'listing')
+    if format == 'dot':
+        print(dis.toDot())
+    elif format == 'json':
+        print(dis.toJSON())
+    else:
+        print(dis.listing())
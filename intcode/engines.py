@@ -0,0 +1,44 @@
+from . import tracing
+from .ops import DAY9_OPS
+from .processor import IntcodeProcessor, getInput, writeOutput
+from .compiled import ThreadedIntcodeProcessor, BlockIntcodeProcessor
+from .traced import TracingIntcodeProcessor, RecordingIntcodeProcessor
+from .profiler import ProfilingIntcodeProcessor
+
+ENGINES = {
+    'decode': IntcodeProcessor,
+    'threaded': ThreadedIntcodeProcessor,
+    'block': BlockIntcodeProcessor,
+    'traced': TracingIntcodeProcessor,
+    'recording': RecordingIntcodeProcessor,
+    'profiling': ProfilingIntcodeProcessor,
+}
+
+## the block JIT is the fastest on anything that loops; 'decode' has the cheapest forks and restores
+DEFAULT_ENGINE = 'block'
+
+def makeIntcodeProcessor(engine=DEFAULT_ENGINE, getInput=getInput, writeOutput=writeOutput, opcodes=DAY9_OPS,
+                         traced=None):
+    """
+    decouple the operator list from the main driver code
+
+    traced picks the tracing engine over the one asked for; by default it follows setTrace() at the time the machine
+    is made, since the other engines never check it
+    """
+    if traced is None:
+        traced = tracing.TRACE
+    if traced:
+        engine = 'traced'
+    return ENGINES[engine](opcodes, getInput, writeOutput)
+
+## options the day drivers share: --engine=<name> picks the engine (see engineFromArgs()), and --profile=text|json
+## runs on the profiling engine and reports where the time went
+def optionFromArgs(argv, name, default=None):
+    """pick up an optional --<name>=<value> from the command line"""
+    for arg in argv:
+        if arg.startswith('--{}='.format(name)):
+            return arg.split('=', 1)[1]
+    return default
+
+def engineFromArgs(argv, default=DEFAULT_ENGINE):
+    return optionFromArgs(argv, 'engine', default)
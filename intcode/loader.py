@@ -0,0 +1,112 @@
+"""
+Program loader: parses an Intcode source file (leading '#' comment lines, then one line of comma separated values)
+once, and keeps a binary image of it next to the source that later runs memory-map instead of parsing again.
+
+The image holds the words as 64-bit integers, with a side table for any that do not fit, the comment lines, and a
+hash of the source; an image whose hash does not match the source (or that cannot be read) is rebuilt.
+"""
+import array
+import hashlib
+import mmap
+import os
+import struct
+import sys
+
+from .tracing import trace
+
+## image header: magic, byte order of the words, source hash, word count, side table entries, comment bytes
+HEADER = struct.Struct('<8s1s32sQQQ')
+MAGIC = b'ICIMAGE1'
+ORDER = sys.byteorder[0].encode()
+## side table entry: word index and length of the two's complement bytes that follow
+BIG = struct.Struct('<QI')
+SUFFIX = '.icimg'
+
+def imagePath(path):
+    return path + SUFFIX
+
+def parseProgram(text):
+    """(comment lines, program) from source text"""
+    comments = []
+    lines = iter(text.splitlines())
+    line = next(lines, '').strip()
+    while line.startswith('#'):
+        comments.append(line)
+        line = next(lines, '').strip()
+    return comments, [int(x) for x in line.split(',')] if line else []
+
+def writeImage(path, digest, program, comments):
+    """write the image for a parsed program, via a temporary file so a reader never sees half of one"""
+    words = array.array('q', bytes(8 * len(program)))
+    bigs = []
+    for i, value in enumerate(program):
+        try:
+            words[i] = value
+        except OverflowError:
+            bigs.append((i, value))
+    text = "\n".join(comments).encode()
+    with open(path + '.tmp', 'wb') as f:
+        f.write(HEADER.pack(MAGIC, ORDER, digest, len(program), len(bigs), len(text)))
+        f.write(words.tobytes())
+        for i, value in bigs:
+            data = value.to_bytes((value.bit_length() + 8) // 8, 'little', signed=True)
+            f.write(BIG.pack(i, len(data)))
+            f.write(data)
+        f.write(text)
+    os.replace(path + '.tmp', path)
+
+def readImage(path, digest):
+    """(comment lines, program) from the image at path, or None if it is missing, stale or damaged"""
+    try:
+        with open(path, 'rb') as f:
+            image = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):
+        return None
+    with image:
+        try:
+            magic, order, stored, count, nbigs, ntext = HEADER.unpack_from(image, 0)
+            if magic != MAGIC or order != ORDER or stored != digest:
+                return None
+            offset = HEADER.size
+            if offset + 8 * count > len(image):
+                return None
+            with memoryview(image)[offset:offset + 8 * count] as view, view.cast('q') as words:
+                program = words.tolist()
+            if len(program) != count:
+                return None
+            offset += 8 * count
+            for _ in range(nbigs):
+                i, size = BIG.unpack_from(image, offset)
+                offset += BIG.size
+                program[i] = int.from_bytes(image[offset:offset + size], 'little', signed=True)
+                offset += size
+            if offset + ntext > len(image):
+                return None
+            text = image[offset:offset + ntext].decode()
+        except (struct.error, IndexError, TypeError, ValueError):
+            return None
+    return text.split("\n") if text else [], program
+
+def loadProgram(path, echo=print, cached=True):
+    """
+    the program in the source file at path, echoing its comment lines (echo=None to keep quiet)
+
+    With cached, the image next to the source is used when it is up to date and written when it is not; a directory
+    that cannot be written to just means parsing every time.
+    """
+    with open(path, 'rb') as f:
+        source = f.read()
+    digest = hashlib.sha256(source).digest()
+    loaded = readImage(imagePath(path), digest) if cached else None
+    if loaded is None:
+        loaded = parseProgram(source.decode())
+        if cached:
+            try:
+                writeImage(imagePath(path), digest, loaded[1], loaded[0])
+            except OSError as ex:
+                trace("program image not written: {}".format(ex))
+    comments, program = loaded
+    if echo is not None:
+        for line in comments:
+            echo(line)
+    return program
@@ -0,0 +1,237 @@
+"""
+Lockstep batch engine: many copies of one program run side by side over a 2-D NumPy memory, one row per lane, for
+sweeps that run the same program over thousands of inputs (day 2 noun/verb pairs, day 7 phase settings).
+
+Each step groups the live lanes by the instruction word at their pc and executes every group as one vectorised
+operation, so lanes that branch apart just fall into different groups and the rest are masked out. Lanes are
+limited to 64-bit values: a lane that overflows, reads or jumps somewhere it cannot, or meets an unknown opcode is
+marked FAULTED and left behind while the others carry on.
+
+NumPy is optional, nothing else in the package needs it; LockstepBatch raises ImportError when it is missing.
+"""
+import collections
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from .ops import REL, IMM, IND, OpAdd, OpMul, OpInput, OpOutput, OpJNZ, OpJZ, OpLT, OpEQ, OpSRB, OpEnd, DAY9_OPS
+from .ops import opName
+from .processor import HALTED, NEEDS_INPUT
+
+## lane states
+RUNNING = 'running'
+FAULTED = 'faulted'
+STATES = (RUNNING, HALTED, NEEDS_INPUT, FAULTED)
+_RUNNING, _HALTED, _NEEDS_INPUT, _FAULTED = range(len(STATES))
+
+## writes at most this far past the end of the memory columns grow them, anything further faults the lane
+GROW_LIMIT = 1 << 16
+
+def requireNumpy():
+    if numpy is None:
+        raise ImportError("the lockstep engine needs NumPy (pip install numpy)")
+
+def _addKernel(batch, group, pcs, in1, in2, outaddr):
+    value = in1 + in2
+    # signed overflow: the result's sign differs from both inputs'
+    batch.store(group, outaddr, value, ((in1 ^ value) & (in2 ^ value)) < 0)
+    return pcs + 4
+
+def _mulKernel(batch, group, pcs, in1, in2, outaddr):
+    value = in1 * in2
+    divisor = numpy.where(in1 == 0, 1, in1)
+    overflow = (in1 != 0) & ((value // divisor != in2) | ((in1 == -1) & (in2 == numpy.iinfo(numpy.int64).min)))
+    batch.store(group, outaddr, value, overflow)
+    return pcs + 4
+
+def _inputKernel(batch, group, pcs, outaddr):
+    waiting = numpy.zeros(len(group), dtype=bool)
+    values = numpy.zeros(len(group), dtype=numpy.int64)
+    for i, lane in enumerate(group.tolist()):
+        if batch.inputs[lane]:
+            values[i] = batch.inputs[lane].popleft()
+        else:
+            waiting[i] = True
+    batch.state[group[waiting]] = _NEEDS_INPUT
+    batch.store(group[~waiting], outaddr[~waiting], values[~waiting])
+    return numpy.where(waiting, pcs, pcs + 2)
+
+def _outputKernel(batch, group, pcs, value):
+    for lane, v in zip(group.tolist(), value.tolist()):
+        batch.outputs[lane].append(v)
+    return pcs + 2
+
+def _jnzKernel(batch, group, pcs, flag, dst):
+    return numpy.where(flag != 0, dst, pcs + 3)
+
+def _jzKernel(batch, group, pcs, flag, dst):
+    return numpy.where(flag == 0, dst, pcs + 3)
+
+def _ltKernel(batch, group, pcs, left, right, dst):
+    batch.store(group, dst, (left < right).astype(numpy.int64))
+    return pcs + 4
+
+def _eqKernel(batch, group, pcs, left, right, dst):
+    batch.store(group, dst, (left == right).astype(numpy.int64))
+    return pcs + 4
+
+def _srbKernel(batch, group, pcs, delta):
+    batch.relative_base[group] += delta
+    return pcs + 2
+
+def _endKernel(batch, group, pcs):
+    batch.state[group] = _HALTED
+    return pcs
+
+## vectorised operator bodies: (batch, lane indices, their pcs, *parameter columns) -> next pcs
+KERNELS = {
+    OpAdd.OPC: _addKernel,
+    OpMul.OPC: _mulKernel,
+    OpInput.OPC: _inputKernel,
+    OpOutput.OPC: _outputKernel,
+    OpJNZ.OPC: _jnzKernel,
+    OpJZ.OPC: _jzKernel,
+    OpLT.OPC: _ltKernel,
+    OpEQ.OPC: _eqKernel,
+    OpSRB.OPC: _srbKernel,
+    OpEnd.OPC: _endKernel,
+}
+
+class LockstepBatch:
+    """
+    lanes copies of program, each with its own memory row, pc, relative base, input queue and output list. Input
+    is queued per lane with send() before running; a lane that runs out of input waits in NEEDS_INPUT until more is
+    sent and run() is called again.
+    """
+    def __init__(self, program, lanes, opcodes=DAY9_OPS):
+        requireNumpy()
+        for op in opcodes:
+            if op.OPC not in KERNELS:
+                raise ValueError("the lockstep engine has no vectorised {}".format(opName(op)))
+        self.ops = dict([(op.OPC, op) for op in opcodes])
+        self.lanes = lanes
+        image = numpy.array(program, dtype=numpy.int64)
+        self.dat = numpy.zeros((lanes, max(len(image), 1)), dtype=numpy.int64)
+        self.dat[:, :len(image)] = image
+        self.pc = numpy.zeros(lanes, dtype=numpy.int64)
+        self.relative_base = numpy.zeros(lanes, dtype=numpy.int64)
+        self.state = numpy.full(lanes, _RUNNING, dtype=numpy.int8)
+        self.inputs = [collections.deque() for _ in range(lanes)]
+        self.outputs = [[] for _ in range(lanes)]
+        self.steps = 0 # vectorised group executions, for comparing against lanes x instructions
+
+    def poke(self, addr, values):
+        """write values (one per lane, or one for all) to addr in every lane's memory"""
+        self.grow(addr + 1)
+        self.dat[:, addr] = values
+
+    def peek(self, addr):
+        """the value at addr in every lane, as a column"""
+        if addr >= self.dat.shape[1]:
+            return numpy.zeros(self.lanes, dtype=numpy.int64)
+        return self.dat[:, addr]
+
+    def send(self, lane, *values):
+        self.inputs[lane].extend(values)
+        if self.state[lane] == _NEEDS_INPUT:
+            self.state[lane] = _RUNNING
+
+    def takeOutputs(self, lane):
+        outputs = self.outputs[lane]
+        self.outputs[lane] = []
+        return outputs
+
+    def status(self, lane):
+        return STATES[self.state[lane]]
+
+    def counts(self):
+        """how many lanes are in each state"""
+        return dict((name, int(n)) for name, n in zip(STATES, numpy.bincount(self.state, minlength=len(STATES))))
+
+    def fault(self, lanes):
+        self.state[lanes] = _FAULTED
+
+    def grow(self, width):
+        if width > self.dat.shape[1]:
+            width = max(width, 2 * self.dat.shape[1])
+            wider = numpy.zeros((self.lanes, width), dtype=numpy.int64)
+            wider[:, :self.dat.shape[1]] = self.dat
+            self.dat = wider
+
+    def load(self, group, addrs):
+        """the words at addrs, one per lane in group; anything past the columns reads as 0"""
+        inside = addrs < self.dat.shape[1]
+        if inside.all():
+            return self.dat[group, addrs]
+        values = numpy.zeros(len(group), dtype=numpy.int64)
+        values[inside] = self.dat[group[inside], addrs[inside]]
+        return values
+
+    def store(self, group, addrs, values, overflow=None):
+        """write values to addrs, one per lane in group, faulting lanes that overflowed or write out of reach"""
+        bad = addrs >= self.dat.shape[1] + GROW_LIMIT
+        if overflow is not None:
+            bad |= overflow
+        if bad.any():
+            self.fault(group[bad])
+            group, addrs, values = group[~bad], addrs[~bad], values[~bad]
+        if len(group):
+            self.grow(int(addrs.max()) + 1)
+            self.dat[group, addrs] = values
+
+    def run(self):
+        """step every running lane until each has halted, faulted or is waiting for input"""
+        while True:
+            live = numpy.flatnonzero(self.state == _RUNNING)
+            if not len(live):
+                return
+            pcs = self.pc[live]
+            if (pcs < 0).any():
+                self.fault(live[pcs < 0])
+                continue
+            words = self.load(live, pcs)
+            if (words == words[0]).all():
+                self.stepGroup(int(words[0]), live, pcs)
+                continue
+            for word in numpy.unique(words).tolist():
+                same = words == word
+                self.stepGroup(word, live[same], pcs[same])
+
+    def stepGroup(self, word, group, pcs):
+        """execute the instruction word for every lane in group, each with its own operands"""
+        self.steps += 1
+        op = self.ops.get(word % 100)
+        if op is None or word < 0:
+            self.fault(group)
+            return
+        # resolve parameters: values to read, or addresses to write
+        pmask = word // 100
+        params = []
+        bad = numpy.zeros(len(group), dtype=bool)
+        for i, e in enumerate(op.PARAM):
+            mode = pmask % 10
+            pmask //= 10
+            raw = self.load(group, pcs + 1 + i)
+            if mode == IMM:
+                if e == IND:
+                    self.fault(group) # an output parameter in immediate mode
+                    return
+                params.append((False, raw))
+            elif mode in (IND, REL):
+                addrs = raw + self.relative_base[group] if mode == REL else raw
+                bad |= addrs < 0
+                params.append((e == IMM, addrs))
+            else:
+                self.fault(group)
+                return
+        if bad.any():
+            self.fault(group[bad])
+            keep = ~bad
+            group, pcs = group[keep], pcs[keep]
+            params = [(deref, values[keep]) for deref, values in params]
+        if not len(group):
+            return
+        params = [self.load(group, values) if deref else values for deref, values in params]
+        self.pc[group] = KERNELS[op.OPC](self, group, pcs, *params)
@@ -0,0 +1,93 @@
+"""
+Memoised whole runs: a program started fresh with its input queued up front can only depend on the program, the
+operators it runs on and those inputs, so its outputs can be kept and handed back the next time the same run comes
+round (day 7 asks for the same (phase, signal) pair over and over).
+
+Only runs that show they are whole are kept: the program halted, having read every input it was given and asked
+for no more. Runs that block for input, and anything run while tracing (the trace is a side effect), go through
+uncached.
+"""
+import array
+import collections
+import hashlib
+
+from . import tracing
+from .ops import DAY9_OPS
+from .processor import HALTED
+from .engines import DEFAULT_ENGINE, makeIntcodeProcessor
+
+def programDigest(program):
+    """a hash of the program's words, to key runs by"""
+    try:
+        data = array.array('q', program).tobytes()
+    except OverflowError:
+        data = ",".join(str(word) for word in program).encode()
+    return hashlib.sha256(data).digest()
+
+class RunCache:
+    """
+    LRU cache of outputs keyed by (program digest, opcode set, inputs), holding at most max_entries runs and
+    max_values output values between them
+    """
+    def __init__(self, max_entries=4096, max_values=1 << 20):
+        self.entries = collections.OrderedDict()
+        self.max_entries = max_entries
+        self.max_values = max_values
+        self.values = 0
+        self.hits = 0
+        self.misses = 0
+        self.uncached = 0
+        self.digests = {} # id(program) -> (program, digest), so a program passed in again is not hashed again
+
+    def digest(self, program):
+        known = self.digests.get(id(program))
+        if known is not None and known[0] is program:
+            return known[1]
+        digest = programDigest(program)
+        if len(self.digests) >= 64:
+            self.digests.clear()
+        self.digests[id(program)] = (program, digest)
+        return digest
+
+    def run(self, program, inputs=(), engine=DEFAULT_ENGINE, opcodes=DAY9_OPS):
+        """
+        the outputs of program run fresh with inputs queued, as (status, outputs) like run_until_io(); the digest of
+        a list is remembered while it is the same object, so do not change a program in place between calls
+        """
+        if tracing.TRACE:
+            self.uncached += 1
+            return self.execute(program, inputs, engine, opcodes)[:2]
+        key = (self.digest(program), tuple(op.OPC for op in opcodes), tuple(inputs))
+        outputs = self.entries.get(key)
+        if outputs is not None:
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return HALTED, list(outputs)
+        self.misses += 1
+        status, outputs, whole = self.execute(program, inputs, engine, opcodes)
+        if whole:
+            self.store(key, tuple(outputs))
+        else:
+            self.uncached += 1
+        return status, outputs
+
+    @staticmethod
+    def execute(program, inputs, engine, opcodes):
+        """run it for real: (status, outputs, whether the run was whole)"""
+        ipc = makeIntcodeProcessor(engine, opcodes=opcodes)
+        ipc.start(program, inputs)
+        status, outputs = ipc.run_until_io()
+        return status, outputs, status == HALTED and not ipc.inputs
+
+    def store(self, key, outputs):
+        if len(outputs) > self.max_values:
+            return
+        self.entries[key] = outputs
+        self.values += len(outputs)
+        while len(self.entries) > self.max_entries or self.values > self.max_values:
+            _, evicted = self.entries.popitem(last=False)
+            self.values -= len(evicted)
+
+    def clear(self):
+        self.entries.clear()
+        self.values = 0
@@ -0,0 +1,186 @@
+import array
+
+from .tracing import trace
+
+class Memory:
+    """
+    Intcode memory: the program image plus a growable contiguous region held in an array('q'), and a sparse dict
+    for addresses far beyond it.
+
+    The array is promoted to a list of Python ints the first time a value does not fit in 64 bits. Reads outside
+    the written area return 0 without storing anything. With compact=False the words start out as a list, which
+    the compiled engines need so their generated code can index it directly; it is only ever extended in place.
+    """
+    ## writes at most this far past the end of the contiguous region grow it, anything further goes in the sparse dict
+    GROW_LIMIT = 1 << 16
+
+    def __init__(self, program=(), compact=True):
+        program = list(program)
+        self.loaded = len(program) # words the program came with, see toList()
+        self.words = program
+        if compact:
+            try:
+                self.words = array.array('q', program)
+            except OverflowError:
+                pass
+        self.sparse = {}
+
+    def __getitem__(self, addr):
+        if addr < 0:
+            raise IndexError("negative address {}".format(addr))
+        try:
+            return self.words[addr]
+        except IndexError:
+            return self.sparse.get(addr, 0)
+
+    def __setitem__(self, addr, value):
+        if addr < 0:
+            raise IndexError("negative address {}".format(addr))
+        size = len(self.words)
+        if addr >= size:
+            if addr - size >= Memory.GROW_LIMIT:
+                self.sparse[addr] = value
+                return
+            self.grow(max(addr + 1, 2 * size))
+        try:
+            self.words[addr] = value
+        except OverflowError:
+            self.promote()
+            self.words[addr] = value
+
+    def grow(self, size):
+        """extend the contiguous region to size words, pulling in any sparse values it now covers"""
+        self.words.extend([0] * (size - len(self.words)))
+        for addr in [a for a in self.sparse if a < size]:
+            self[addr] = self.sparse.pop(addr)
+
+    def promote(self):
+        trace("promoting memory to python ints")
+        self.words = list(self.words)
+
+    def __len__(self):
+        """one past the highest address holding data"""
+        return max(len(self.words), max(self.sparse, default=-1) + 1)
+
+    def toList(self):
+        return trimPadding([self[a] for a in range(len(self))], self.loaded)
+
+    def fork(self):
+        """an independent copy (the compiled engines index the words directly, so they cannot share them)"""
+        other = Memory()
+        other.loaded = self.loaded
+        other.words = self.words[:]
+        other.sparse = dict(self.sparse)
+        return other
+
+    def restore(self, other):
+        """take on the contents of other, in place so that code holding on to the words stays valid"""
+        if type(self.words) is type(other.words):
+            self.words[:] = other.words
+        else:
+            self.words = other.words[:]
+        self.sparse = dict(other.sparse)
+        self.loaded = other.loaded
+
+def trimPadding(values, loaded):
+    """
+    values without the zeros that growing memory padded it with: up to the end of the loaded program or the last
+    nonzero value past it, so a dump stops where the program's own data does
+    """
+    end = len(values)
+    while end > loaded and values[end - 1] == 0:
+        end -= 1
+    del values[end:]
+    return values
+
+def makePage(values):
+    try:
+        return array.array('q', values)
+    except OverflowError:
+        return list(values)
+
+## PagedMemory page geometry
+PAGE_BITS = 8
+PAGE_SIZE = 1 << PAGE_BITS
+PAGE_MASK = PAGE_SIZE - 1
+
+class PagedMemory:
+    """
+    Compact copy-on-write memory: the address space is split into fixed-size pages of array('q'), and forks share
+    pages until one side writes to them, so a fork only costs the pages it dirties.
+
+    A page is promoted to a list of Python ints the first time one of its values does not fit in 64 bits, and
+    addresses far beyond the last page go in a sparse dict.
+    """
+    def __init__(self, program=()):
+        program = list(program)
+        self.loaded = len(program)
+        program.extend([0] * (-len(program) % PAGE_SIZE))
+        self.pages = [makePage(program[base:base + PAGE_SIZE])
+                      for base in range(0, len(program), PAGE_SIZE)]
+        self.owned = [True] * len(self.pages) # pages this memory may write without copying
+        self.sparse = {}
+
+    def __getitem__(self, addr):
+        if addr < 0:
+            raise IndexError("negative address {}".format(addr))
+        try:
+            return self.pages[addr >> PAGE_BITS][addr & PAGE_MASK]
+        except IndexError:
+            return self.sparse.get(addr, 0)
+
+    def __setitem__(self, addr, value):
+        if addr < 0:
+            raise IndexError("negative address {}".format(addr))
+        index = addr >> PAGE_BITS
+        if index >= len(self.pages):
+            if addr - len(self.pages) * PAGE_SIZE >= Memory.GROW_LIMIT:
+                self.sparse[addr] = value
+                return
+            self.grow(max(index + 1, 2 * len(self.pages)))
+        page = self.pages[index]
+        if not self.owned[index]:
+            page = page[:]
+            self.pages[index] = page
+            self.owned[index] = True
+        try:
+            page[addr & PAGE_MASK] = value
+        except OverflowError:
+            trace("promoting page {} to python ints".format(index))
+            page = list(page)
+            self.pages[index] = page
+            page[addr & PAGE_MASK] = value
+
+    def grow(self, npages):
+        """extend to npages pages, pulling in any sparse values they now cover"""
+        while len(self.pages) < npages:
+            self.pages.append(makePage([0] * PAGE_SIZE))
+            self.owned.append(True)
+        size = npages * PAGE_SIZE
+        for addr in [a for a in self.sparse if a < size]:
+            self[addr] = self.sparse.pop(addr)
+
+    def __len__(self):
+        """one past the highest address holding data (rounded up to a whole page)"""
+        return max(len(self.pages) * PAGE_SIZE, max(self.sparse, default=-1) + 1)
+
+    def toList(self):
+        return trimPadding([self[a] for a in range(len(self))], self.loaded)
+
+    def fork(self):
+        """a copy sharing every page with this memory; whichever side writes to a page first copies it"""
+        other = PagedMemory()
+        other.loaded = self.loaded
+        other.pages = self.pages[:]
+        other.sparse = dict(self.sparse)
+        self.owned = [False] * len(self.pages)
+        other.owned = [False] * len(self.pages)
+        return other
+
+    def restore(self, other):
+        """take on the contents of other, sharing its pages"""
+        self.pages = other.pages[:]
+        self.sparse = dict(other.sparse)
+        self.loaded = other.loaded
+        self.owned = [False] * len(self.pages)
+        other.owned = [False] * len(other.pages)
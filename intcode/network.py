@@ -0,0 +1,159 @@
+"""
+Network of Intcode machines in one process: each machine boots with its address as its first input, then sends
+packets by outputting a destination address followed by the packet's values, and receives them as input.
+
+The router only runs machines that have something to do (just booted, or with packets delivered since they last
+blocked), and packets sent during a round are batched per destination and delivered together at the end of it.
+When no machine has anything left to do the network is idle, which is when NAT-style monitors step in.
+"""
+import collections
+
+from .ops import DAY9_OPS
+from .processor import HALTED, NEEDS_INPUT, PREEMPTED
+from .engines import DEFAULT_ENGINE, makeIntcodeProcessor
+
+Packet = collections.namedtuple('Packet', 'source dest values')
+
+## instructions a machine runs per turn before the others get theirs
+ROUTER_SLICE = 10000
+
+class Monitor:
+    """
+    sits on an address outside the machines and sees every packet sent there; when the network goes idle it may
+    send something to wake it up
+    """
+    def receive(self, router, packet):
+        pass
+
+    def idle(self, router):
+        """called when the network is idle; return True if it sent anything, False lets the network stop"""
+        return False
+
+class NatMonitor(Monitor):
+    """
+    keeps the last packet sent to it and, whenever the network goes idle, sends it on to address 0; the network
+    stops once the same values would be sent twice running, which sent[-1] then holds
+    """
+    def __init__(self):
+        self.last = None
+        self.sent = []
+
+    def receive(self, router, packet):
+        self.last = packet.values
+
+    def idle(self, router):
+        if self.last is None or (self.sent and self.sent[-1] == self.last):
+            return False
+        self.sent.append(self.last)
+        router.send(0, *self.last)
+        return True
+
+class Router:
+    """
+    size machines running program, at addresses 0 to size-1. Packets carry packet_size values; packets to the
+    broadcast address (if any) go to every other machine, packets to a monitor's address go to the monitor, and
+    packets to anywhere else are dropped and counted.
+
+    With empty_input set (-1 for the puzzle convention), a machine reading an empty queue is given that value once
+    instead of blocking, and blocks on the next empty read, so polling programs still go idle.
+    """
+    def __init__(self, program, size, engine=DEFAULT_ENGINE, opcodes=DAY9_OPS, packet_size=2, broadcast=None,
+                 empty_input=None):
+        self.machines = []
+        for address in range(size):
+            ipc = makeIntcodeProcessor(engine, opcodes=opcodes)
+            ipc.start(program, [address])
+            self.machines.append(ipc)
+        self.packet_size = packet_size
+        self.broadcast = broadcast
+        self.empty_input = empty_input
+        self.monitors = {}
+        self.ready = dict.fromkeys(range(size)) # addresses to run next round, in order
+        self.partial = [[] for _ in range(size)] # outputs that do not make a whole packet yet
+        self.given_empty = [False] * size
+        self.outbound = collections.defaultdict(list) # address -> values to deliver at the end of the round
+        self.packets = 0
+        self.dropped = 0
+        self.rounds = 0
+
+    def attach(self, address, monitor):
+        self.monitors[address] = monitor
+        return monitor
+
+    def send(self, dest, *values):
+        """queue values for a machine, delivered at the end of the current round"""
+        self.outbound[dest].extend(values)
+
+    def route(self, packet):
+        self.packets += 1
+        if packet.dest in self.monitors:
+            self.monitors[packet.dest].receive(self, packet)
+        elif packet.dest == self.broadcast:
+            for address in range(len(self.machines)):
+                if address != packet.source:
+                    self.send(address, *packet.values)
+        elif 0 <= packet.dest < len(self.machines):
+            self.send(packet.dest, *packet.values)
+        else:
+            self.dropped += 1
+
+    def runMachine(self, address):
+        """give one machine its turn, routing what it outputs; returns True if it wants another turn"""
+        ipc = self.machines[address]
+        while True:
+            status, outputs = ipc.run_until_io(budget=ROUTER_SLICE)
+            if outputs:
+                pending = self.partial[address]
+                pending.extend(outputs)
+                whole = len(pending) - len(pending) % (1 + self.packet_size)
+                for n in range(0, whole, 1 + self.packet_size):
+                    self.route(Packet(address, pending[n], tuple(pending[n + 1:n + 1 + self.packet_size])))
+                del pending[:whole]
+            if status == NEEDS_INPUT and self.empty_input is not None and not self.given_empty[address]:
+                self.given_empty[address] = True
+                ipc.send(self.empty_input)
+                continue
+            return status == PREEMPTED
+
+    def deliver(self):
+        """hand every batch queued this round to its machine, scheduling the ones that were not halted"""
+        for address, values in self.outbound.items():
+            ipc = self.machines[address]
+            if ipc.halted:
+                continue
+            ipc.send(*values)
+            self.given_empty[address] = False
+            self.ready[address] = None
+        self.outbound.clear()
+
+    def step(self):
+        """one round: run every scheduled machine once, then deliver; returns False when the network is idle"""
+        ready = self.ready
+        self.ready = {}
+        for address in ready:
+            if self.runMachine(address):
+                self.ready[address] = None
+        self.deliver()
+        self.rounds += 1
+        return bool(self.ready)
+
+    def run(self, rounds=None):
+        """
+        run until the network is idle and no monitor wakes it, or every machine has halted, or (if given) for at
+        most rounds rounds; returns True if it stopped idle or halted
+        """
+        while rounds is None or self.rounds < rounds:
+            if self.step():
+                continue
+            if all(ipc.halted for ipc in self.machines):
+                return True
+            # every monitor hears about it, even once one of them has woken the network
+            woken = [monitor.idle(self) for monitor in self.monitors.values()]
+            if not any(woken):
+                return True
+            self.deliver()
+        return False
+
+    def statuses(self):
+        """each machine's state once run() has stopped idle"""
+        return [HALTED if ipc.halted else NEEDS_INPUT for ipc in self.machines]
@@ -0,0 +1,219 @@
+## parameter modes
+REL=2
+IMM=1
+IND=0
+modestring = {REL:"REL", IMM:"IMM", IND:"IND"}
+
+class GenericOp:
+    """
+    Generic wrapper for operators: decodes the parameters on every call, logging each one through ipc.log(), so it is
+    only used by the tracing engine.
+
+    We use "opcode" to mean the integer value in the code, "*Op" to mean the class implementing that operator.
+
+    Preconditions on concrete class:
+     - PARAM contains expected parameter types including output addr if any
+     - TRACE (optional) is the format for the tracing engine's line about the instruction, with {n} standing for
+       parameter n, {result} for the value written (or the next pc if nothing is written), {base} and {rb} for the
+       relative base before and after, and {test} for what test() (optional) makes of the parameters
+     - EMIT (optional) holds Python source lines for the threaded engine, with {n} standing for parameter n
+       and a leading "{out} = " storing into the output parameter
+     - BLOCK_END (optional) marks operators that close a basic block (jumps, I/O, end) for the block compiler
+     - SUSPENDS (optional) marks operators whose endpoint may pause the machine; they are never compiled into a block
+    """
+    @staticmethod
+    def __parse_params(opcode, expected, ipc, pc):
+        source = ipc.dat
+        pmask = opcode // 100
+        opstr = str([source[x] for x in range(pc, pc+len(expected))])
+        ipc.log("[{0}] decode {1} with pmask {2:0{3}} ={4}=".format(pc, opcode, pmask, len(expected), opstr))
+        pc += 1 # skip the opcode itself
+        params = []
+        relative_base = ipc.relative_base
+        for e in expected:
+            actual = pmask % 10
+            if actual == e:
+                ipc.log("[{}] param: {} {}".format(pc, modestring[e], source[pc]))
+                params.append(source[pc])
+            elif actual == IND and e == IMM:
+                # expected imm got ind, so dereference
+                ipc.log("[{}] param: deref *{} -> {}".format(pc, source[pc], source[source[pc]]))
+                params.append(source[source[pc]])
+            elif actual == REL and e == IMM:
+                # expected imm got rel, so dereference
+                ipc.log("[{}] param: deref *({}{:+d}) -> {}".format(pc, source[pc], relative_base, source[source[pc]+relative_base]))
+                params.append(source[source[pc]+relative_base])
+            elif actual == REL and e == IND:
+                # expected imm got rel, so calculate absolute address
+                ipc.log("[{}] param: relbase ({}{:+d}) -> {}".format(pc, source[pc], relative_base, source[pc]+relative_base))
+                params.append(source[pc]+relative_base)
+            else:
+                # expected ind, got imm !?
+                source_slice = [source[x] for x in range(pc, pc+len(expected))]
+                ipc.log("got param type {} but expected {} in OPC:{} PMASK:{} expected:{} PC:{} source:{}".format(actual, e, opcode, pmask, expected, pc, source_slice))
+                assert(False)
+            pc += 1
+            pmask = pmask // 10
+        return params
+
+    @staticmethod
+    def execute(operator, opcode, ipc, pc):
+        params = GenericOp.__parse_params(opcode, operator.PARAM, ipc, pc)
+        return operator.execute(ipc, pc, *params)
+
+class OpAdd:
+    OPC = 1
+    PARAM = [IMM,IMM,IND]
+    TRACE = "ADD ({0}) ({1}) -> *{2}"
+    EMIT = ["{out} = {0} + {1}"]
+
+    @staticmethod
+    def execute(ipc, pc, in1, in2, outaddr):
+        ipc.dat[outaddr] = in1 + in2
+        return pc + 1 + len(OpAdd.PARAM)
+
+class OpMul:
+    OPC = 2
+    PARAM = [IMM,IMM,IND]
+    TRACE = "MUL ({0}) ({1}) -> *{2}"
+    EMIT = ["{out} = {0} * {1}"]
+
+    @staticmethod
+    def execute(ipc, pc, in1, in2, outaddr):
+        ipc.dat[outaddr] = in1 * in2
+        return pc + 1 + len(OpMul.PARAM)
+
+class OpInput:
+    OPC = 3
+    PARAM = [IND]
+    TRACE = "INP ({result}) -> *{0}"
+    EMIT = ["{out} = proc.getInput('[%d] enter a value: ' % pc)"]
+    BLOCK_END = True
+    SUSPENDS = True
+
+    @staticmethod
+    def execute(ipc, pc, outaddr):
+        ipc.dat[outaddr] = ipc.getInput('[{0}] enter a value: '.format(pc))
+        return pc + 1 + len(OpInput.PARAM)
+
+class OpOutput:
+    OPC = 4
+    PARAM = [IMM]
+    TRACE = "OUT {0}"
+    EMIT = ["proc.writeOutput('[%d] OUT ' % pc, {0})"]
+    BLOCK_END = True
+    SUSPENDS = True
+
+    @staticmethod
+    def execute(ipc, pc, value):
+        ipc.writeOutput("[{}] OUT ".format(pc), value)
+        return pc + 1 + len(OpOutput.PARAM)
+
+class OpJNZ:
+    OPC = 5
+    PARAM = [IMM, IMM]
+    TRACE = "JNZ {0} ({test}) {1}"
+    EMIT = ["if {0}: return {1}"]
+    BLOCK_END = True
+
+    @staticmethod
+    def test(flag, dst):
+        return bool(flag)
+
+    @staticmethod
+    def execute(ipc, pc, flag, dst):
+        if flag:
+            return dst
+        return pc + 1 + len(OpJNZ.PARAM)
+
+class OpJZ:
+    OPC = 6
+    PARAM = [IMM, IMM]
+    TRACE = "JZ {0} ({test}) {1}"
+    EMIT = ["if {0} == 0: return {1}"]
+    BLOCK_END = True
+
+    @staticmethod
+    def test(flag, dst):
+        return flag == 0
+
+    @staticmethod
+    def execute(ipc, pc, flag, dst):
+        if flag == 0:
+            return dst
+        return pc + 1 + len(OpJZ.PARAM)
+
+class OpLT:
+    OPC = 7
+    PARAM = [IMM, IMM, IND]
+    TRACE = "LT {0} {1} ({test}) {2}"
+    EMIT = ["{out} = 1 if {0} < {1} else 0"]
+
+    @staticmethod
+    def test(left, right, dst):
+        return left < right
+
+    @staticmethod
+    def execute(ipc, pc, left, right, dst):
+        if left < right:
+            ipc.dat[dst] = 1
+        else:
+            ipc.dat[dst] = 0
+        return pc + 1 + len(OpLT.PARAM)
+
+class OpEQ:
+    OPC = 8
+    PARAM = [IMM, IMM, IND]
+    TRACE = "EQ {0} {1} ({test}) {2}"
+    EMIT = ["{out} = 1 if {0} == {1} else 0"]
+
+    @staticmethod
+    def test(left, right, dst):
+        return left == right
+
+    @staticmethod
+    def execute(ipc, pc, left, right, dst):
+        if left == right:
+            ipc.dat[dst] = 1
+        else:
+            ipc.dat[dst] = 0
+        return pc + 1 + len(OpLT.PARAM)
+
+class OpSRB:
+    """Set Relative Base"""
+    OPC = 9
+    PARAM = [IMM]
+    TRACE = "SRB {base} {0:+d} -> {rb}"
+    EMIT = ["rb = proc.relative_base = rb + {0}"]
+
+    @staticmethod
+    def execute(ipc, pc, delta):
+        ipc.relative_base += delta
+        return pc + 1 + len(OpSRB.PARAM)
+
+class OpEnd:
+    OPC = 99
+    PARAM = []
+    TRACE = "END"
+    EMIT = ["raise StopIteration(pc)"]
+    BLOCK_END = True
+
+    @staticmethod
+    def execute(ipc, pc):
+        raise StopIteration
+
+def opName(op):
+    """mnemonic for reports and listings: OpAdd -> ADD"""
+    return op.__name__[2:].upper() if op.__name__.startswith('Op') else op.__name__
+
+## opcode sets, each puzzle's machine only knows the operators introduced up to that day
+DAY2_OPS = (OpAdd, OpMul, OpEnd)
+DAY5_OPS = (OpAdd, OpMul, OpInput, OpOutput, OpEnd)
+DAY5_PART2_OPS = (OpAdd, OpMul, OpInput, OpOutput, OpJNZ, OpJZ, OpLT, OpEQ, OpEnd)
+DAY9_OPS = (OpAdd, OpMul, OpInput, OpOutput, OpJNZ, OpJZ, OpLT, OpEQ, OpSRB, OpEnd)
+OPCODE_SETS = {
+    'day2': DAY2_OPS,
+    'day5': DAY5_OPS,
+    'day5-part2': DAY5_PART2_OPS,
+    'day9': DAY9_OPS,
+}
@@ -0,0 +1,340 @@
+import collections
+import itertools
+import time
+
+from .tracing import trace
+from .ops import REL, IMM, IND, OpEnd
+from .memory import PagedMemory
+
+## default I/O endpoints, each processor can be given its own
+def getInput(prompt):
+    return int(input(prompt))
+
+def writeOutput(prompt, value):
+    print(prompt + "{}".format(value))
+
+class Suspend(Exception):
+    """raised from an I/O endpoint to pause the machine, it carries on from ipc.pc when resumed"""
+
+class NeedInput(Suspend):
+    """no input queued; the input instruction has not run and is retried on resume"""
+
+class OutputReady(Suspend):
+    """the output instruction has run; resuming continues after it"""
+
+## run_until_io statuses
+HALTED = 'halted'
+NEEDS_INPUT = 'input'
+OUTPUT = 'output'
+PREEMPTED = 'preempted' # out of instruction budget or past the deadline, run() carries on from ipc.pc
+
+## a run with a deadline looks at the clock once every this many instructions
+CLOCK_SLICE = 10000
+
+## decoded parameter fetch kinds, resolved once per cached instruction
+FETCH_LIT=0     # value is used as-is (immediate, or an output address)
+FETCH_DEREF=1   # value is an address to read
+FETCH_RDEREF=2  # value is an offset from the relative base to read
+FETCH_RADDR=3   # value is an offset from the relative base used as an output address
+FETCH_WORD=4    # value is an address known to be inside the contiguous words (generated code only)
+FETCH_FORWARD=5 # value is the one the previous instruction just stored there (generated code only)
+
+## everything needed to put a machine back the way it was, see IntcodeProcessor.snapshot()
+Snapshot = collections.namedtuple('Snapshot', 'pc relative_base halted memory inputs outputs generation caches')
+_generations = itertools.count()
+
+class IntcodeProcessor:
+    def __init__(self, opcodes, getInput=getInput, writeOutput=writeOutput):
+        self.opcodes = tuple(opcodes)
+        self.ops = dict([(op.OPC, op) for op in opcodes])
+        self.maxlen = max(1 + len(op.PARAM) for op in opcodes)
+        self.getInput = getInput
+        self.writeOutput = writeOutput
+        self.dat = self.newMemory(())
+        self.pc = 0
+        self.relative_base = 0
+        self.generation = next(_generations) # renewed by load(), so snapshots know whether cached code belongs here
+        self.decoded = {}    # pc -> (operator, fetch list, output param indices, length), length always last
+        self.covered = set() # addresses spanned by decoded instructions
+        self.caches_shared = False # decoded and covered belong to a snapshot or fork too, see ownCaches()
+        self.halted = False
+        # run_until_io state, see start()
+        self.inputs = collections.deque()
+        self.outputs = []
+        self.stop_on_output = False
+
+    def decode(self, pc):
+        """decode the instruction at pc once and cache its operator, fetch kinds and operand values"""
+        raw_opcode = self.dat[pc]
+        opcode = raw_opcode % 100
+        if not opcode in self.ops:
+            trace("opcode {}({}) not recognised".format(raw_opcode, opcode))
+        op = self.ops[opcode]
+        pmask = raw_opcode // 100
+        fetch = []
+        outputs = []
+        for i, e in enumerate(op.PARAM):
+            actual = pmask % 10
+            value = self.dat[pc + 1 + i]
+            if actual == e:
+                fetch.append((FETCH_LIT, value))
+            elif actual == IND and e == IMM:
+                fetch.append((FETCH_DEREF, value))
+            elif actual == REL and e == IMM:
+                fetch.append((FETCH_RDEREF, value))
+            elif actual == REL and e == IND:
+                fetch.append((FETCH_RADDR, value))
+            else:
+                # expected ind, got imm !?
+                assert(False)
+            if e == IND:
+                outputs.append(i)
+            pmask = pmask // 10
+        length = 1 + len(op.PARAM)
+        return (op, tuple(fetch), tuple(outputs), length)
+
+    def cache(self, pc, entry):
+        """remember a decoded (or translated) instruction; its length must be the last item"""
+        if self.caches_shared:
+            self.ownCaches()
+        self.decoded[pc] = entry
+        self.covered.update(range(pc, pc + entry[-1]))
+        if entry[-1] > self.maxlen:
+            # a fused superinstruction, invalidate() has to look back further to find it
+            self.maxlen = entry[-1]
+        return entry
+
+    def invalidate(self, addr):
+        """drop any decoded instruction overlapping a written address (self-modifying code)"""
+        for start in range(addr - self.maxlen + 1, addr + 1):
+            entry = self.decoded.get(start)
+            if entry is not None and start + entry[-1] > addr:
+                if self.caches_shared:
+                    self.ownCaches()
+                del self.decoded[start]
+
+    def execute_one(self):
+        entry = self.decoded.get(self.pc)
+        if entry is None:
+            entry = self.translate(self.pc)
+        return self.run_decoded(self.pc, entry)
+
+    def translate(self, pc):
+        """fill the cache entry for pc (the compiled engines cache something faster than the decoded tuple)"""
+        return self.cache(pc, self.decode(pc))
+
+    def predecode(self, pc=0):
+        """
+        fill the cache ahead of time, straight on from pc up to the first end instruction or anything that does not
+        decode, so that a snapshot taken afterwards carries the decoded program with it
+        """
+        while pc not in self.decoded and self.dat[pc] % 100 != OpEnd.OPC:
+            try:
+                entry = self.translate(pc)
+            except (KeyError, AssertionError):
+                return
+            pc += entry[-1]
+
+    def poke(self, addr, value):
+        """write to memory from outside the program, dropping any cached instruction the write lands in"""
+        self.dat[addr] = value
+        if addr in self.covered:
+            self.invalidate(addr)
+
+    def run_decoded(self, pc, entry):
+        op, fetch, outputs, _ = entry
+        dat = self.dat
+        params = []
+        for kind, value in fetch:
+            if kind == FETCH_LIT:
+                params.append(value)
+            elif kind == FETCH_DEREF:
+                params.append(dat[value])
+            elif kind == FETCH_RDEREF:
+                params.append(dat[value + self.relative_base])
+            else:
+                params.append(value + self.relative_base)
+        nextpc = op.execute(self, pc, *params)
+        for i in outputs:
+            if params[i] in self.covered:
+                self.invalidate(params[i])
+        return nextpc
+
+    def newMemory(self, program):
+        return PagedMemory(program)
+
+    def load(self, program):
+        """reset the machine with a fresh copy of program"""
+        self.dat = self.newMemory(program)
+        self.generation = next(_generations)
+        self.pc = 0
+        self.relative_base = 0
+        self.decoded = {}
+        self.covered = set()
+        self.caches_shared = False
+        self.halted = False
+
+    def run(self, budget=None, deadline=None):
+        """
+        run from the current pc until the program ends (or an endpoint raises Suspend), returning HALTED
+
+        Given an instruction budget and/or a deadline (a time.monotonic() value) it may stop early instead and return
+        PREEMPTED, with pc on the next instruction to run. Without either the dispatch loop has no checks at all.
+        """
+        if budget is not None or deadline is not None:
+            return self.runBudgeted(budget, deadline)
+        try:
+            while True:
+                npc = self.execute_one()
+                self.pc = npc
+        except StopIteration:
+            self.halted = True
+            return HALTED
+
+    def runFor(self, count):
+        """
+        run count instructions, stopping sooner if the program ends; returns how many ran (count itself if it ended,
+        which the caller does not look at). The loop does the counting, so instructions are not counted one by one
+        """
+        try:
+            for _ in range(count):
+                self.pc = self.execute_one()
+        except StopIteration:
+            self.halted = True
+        return count
+
+    def runBudgeted(self, budget, deadline):
+        """
+        run() with limits: the engine runs instructions in slices, at most CLOCK_SLICE long when there is a deadline,
+        and the limits are only looked at between slices. Every engine stops on exactly the budget: the compiled ones
+        run the instructions of a step or block that would overrun it one at a time.
+        """
+        left = budget if budget is not None else float('inf')
+        while left > 0:
+            left -= self.runFor(left if deadline is None else min(left, CLOCK_SLICE))
+            if self.halted:
+                return HALTED
+            if deadline is not None and time.monotonic() >= deadline:
+                return PREEMPTED
+        return PREEMPTED
+
+    def execute(self, program, budget=None, deadline=None):
+        """program can be any iterable sequence of integer values; returns HALTED, or PREEMPTED (see run())"""
+        self.load(program)
+        return self.run(budget, deadline)
+
+    def start(self, program, inputs=()):
+        """
+        load program for stepping with run_until_io: input comes from a queue fed by send(), output is collected
+        rather than written out
+        """
+        self.load(program)
+        self.inputs = collections.deque(inputs)
+        self.outputs = []
+        self.stop_on_output = False
+        self.getInput = self.queuedInput
+        self.writeOutput = self.queuedOutput
+
+    def send(self, *values):
+        self.inputs.extend(values)
+
+    def queuedInput(self, prompt):
+        if not self.inputs:
+            raise NeedInput()
+        return self.inputs.popleft()
+
+    def queuedOutput(self, prompt, value):
+        self.outputs.append(value)
+        if self.stop_on_output:
+            raise OutputReady()
+
+    def snapshot(self):
+        """
+        capture pc, relative base, memory and I/O queues; the memory is forked, so the snapshot shares it with the
+        machine until either side writes
+        """
+        return Snapshot(self.pc, self.relative_base, self.halted, self.dat.fork(), tuple(self.inputs),
+                        tuple(self.outputs), self.generation, self.saveCaches())
+
+    def restore(self, snapshot):
+        """put the machine back to a snapshot, which is left untouched and can be restored again"""
+        if snapshot.generation != self.generation:
+            # taken before a different load(), so nothing cached here can be trusted
+            self.load(())
+            self.resetCaches()
+        else:
+            self.restoreCaches(snapshot.caches)
+        self.dat.restore(snapshot.memory)
+        self.pc = snapshot.pc
+        self.relative_base = snapshot.relative_base
+        self.halted = snapshot.halted
+        self.inputs = collections.deque(snapshot.inputs)
+        self.outputs = list(snapshot.outputs)
+
+    def fork(self):
+        """an independent machine of the same engine in the same state, sharing memory copy-on-write"""
+        other = type(self)(self.opcodes, self.getInput, self.writeOutput)
+        other.load(())
+        other.dat = self.dat.fork()
+        other.pc = self.pc
+        other.relative_base = self.relative_base
+        other.halted = self.halted
+        other.inputs = collections.deque(self.inputs)
+        other.outputs = list(self.outputs)
+        other.stop_on_output = self.stop_on_output
+        if self.getInput == self.queuedInput:
+            other.getInput = other.queuedInput
+        if self.writeOutput == self.queuedOutput:
+            other.writeOutput = other.queuedOutput
+        other.restoreCaches(self.forkCaches())
+        return other
+
+    ## decoded instructions are plain data, so any machine with the same memory contents can reuse them; snapshots
+    ## and forks share them copy-on-write, and whichever machine changes them first copies them (once)
+    def saveCaches(self):
+        self.caches_shared = True
+        return (self.decoded, self.covered)
+
+    def forkCaches(self):
+        return self.saveCaches()
+
+    def restoreCaches(self, caches):
+        self.decoded, self.covered = caches
+        self.caches_shared = True
+
+    def resetCaches(self):
+        self.decoded = {}
+        self.covered = set()
+        self.caches_shared = False
+
+    def ownCaches(self):
+        """take a private copy of decoded and covered before changing them, while they are shared"""
+        self.decoded = dict(self.decoded)
+        self.covered = set(self.covered)
+        self.caches_shared = False
+
+    def instructionLength(self, pc):
+        op = self.ops[self.dat[pc] % 100]
+        return 1 + len(op.PARAM)
+
+    def run_until_io(self, stop_on_output=False, budget=None, deadline=None):
+        """
+        resume a machine set up with start() until it halts, needs input that has not been sent, (with
+        stop_on_output) has produced a value, or (with a budget or deadline, see run()) is preempted
+
+        returns (status, outputs) with status one of HALTED, NEEDS_INPUT, OUTPUT or PREEMPTED, and the values output
+        since the last call
+        """
+        status = HALTED
+        if not self.halted:
+            self.stop_on_output = stop_on_output
+            try:
+                status = self.run(budget, deadline)
+            except NeedInput:
+                status = NEEDS_INPUT
+            except OutputReady:
+                self.pc += self.instructionLength(self.pc)
+                status = OUTPUT
+        outputs = self.outputs
+        self.outputs = []
+        return status, outputs
@@ -0,0 +1,100 @@
+import collections
+import json
+import time
+
+from .ops import opName
+from .processor import IntcodeProcessor, NeedInput, getInput, writeOutput
+
+class Profile:
+    """instruction counts per pc and per operator, backward jump targets, and wall time split into I/O and compute"""
+    def __init__(self):
+        self.pcs = collections.Counter()
+        self.ops = collections.Counter()
+        self.loop_heads = collections.Counter() # target pc -> times a jump went back to it
+        self.seconds = 0.0
+        self.io_seconds = 0.0
+        self.io_calls = 0
+
+    def instructions(self):
+        return sum(self.ops.values())
+
+    def toDict(self, top=20):
+        total = self.instructions()
+        return {
+            'instructions': total,
+            'seconds': self.seconds,
+            'io_seconds': self.io_seconds,
+            'compute_seconds': self.seconds - self.io_seconds,
+            'io_calls': self.io_calls,
+            'mix': dict(self.ops.most_common()),
+            'top_pcs': [{'pc': pc, 'count': n} for pc, n in self.pcs.most_common(top)],
+            'loop_heads': [{'pc': pc, 'count': n} for pc, n in self.loop_heads.most_common(top)],
+        }
+
+    def report(self, format='text', top=20):
+        """the hotspot report, as text or (format='json') a JSON document"""
+        if format == 'json':
+            return json.dumps(self.toDict(top), indent=2)
+        total = self.instructions() or 1
+        compute = self.seconds - self.io_seconds
+        lines = ["{} instructions in {:.3f}s: compute {:.3f}s ({:.0f}/s), I/O {:.3f}s over {} calls".format(
+            self.instructions(), self.seconds, compute, self.instructions() / compute if compute > 0 else 0,
+            self.io_seconds, self.io_calls)]
+        lines.append("instruction mix:")
+        for name, n in self.ops.most_common():
+            lines.append("  {:<8} {:>10} {:6.2f}%".format(name, n, 100.0 * n / total))
+        lines.append("top pcs:")
+        for pc, n in self.pcs.most_common(top):
+            lines.append("  {:<8} {:>10} {:6.2f}%".format("[{}]".format(pc), n, 100.0 * n / total))
+        lines.append("loop heads (backward jump targets):")
+        for pc, n in self.loop_heads.most_common(top):
+            lines.append("  {:<8} {:>10}".format("[{}]".format(pc), n))
+        return "\n".join(lines)
+
+def profiledOp(op):
+    """
+    a subclass of op whose execute counts into ipc.profile; I/O operators are timed as well, since the time goes on
+    their endpoints, and jumps note where they go back to
+    """
+    name = opName(op)
+    if getattr(op, 'SUSPENDS', False):
+        def execute(ipc, pc, *params):
+            started = time.perf_counter()
+            ran = True
+            try:
+                return op.execute(ipc, pc, *params)
+            except NeedInput:
+                ran = False # retried once input arrives, so counted then
+                raise
+            finally:
+                ipc.profile.io_seconds += time.perf_counter() - started
+                if ran:
+                    ipc.profile.io_calls += 1
+                    ipc.profile.pcs[pc] += 1
+                    ipc.profile.ops[name] += 1
+    else:
+        def execute(ipc, pc, *params):
+            ipc.profile.pcs[pc] += 1
+            ipc.profile.ops[name] += 1
+            nextpc = op.execute(ipc, pc, *params)
+            if nextpc <= pc:
+                ipc.profile.loop_heads[nextpc] += 1
+            return nextpc
+    return type(op.__name__, (op,), {'execute': staticmethod(execute)})
+
+class ProfilingIntcodeProcessor(IntcodeProcessor):
+    """
+    Profiling engine: runs on the decode cache with operators that count every instruction into self.profile, which
+    keeps adding up across runs until it is replaced.
+    """
+    def __init__(self, opcodes, getInput=getInput, writeOutput=writeOutput):
+        IntcodeProcessor.__init__(self, opcodes, getInput, writeOutput)
+        self.ops = dict([(op.OPC, profiledOp(op)) for op in opcodes])
+        self.profile = Profile()
+
+    def run(self, budget=None, deadline=None):
+        started = time.perf_counter()
+        try:
+            return IntcodeProcessor.run(self, budget, deadline)
+        finally:
+            self.profile.seconds += time.perf_counter() - started
@@ -0,0 +1,19 @@
+"""
+Print a binary trace recorded with python -m intcode <program> --record=<trace file> as the tracing engine's lines.
+"""
+import sys
+
+from .ops import OPCODE_SETS
+from .engines import optionFromArgs
+from .tracebuf import readRecords, loadTrace, decodeTrace
+
+if len(sys.argv) < 2:
+    print("Syntax: python -m intcode.showtrace <trace file> [--last=N] [--ops={}]".format("|".join(OPCODE_SETS)))
+    sys.exit(1)
+
+records = list(readRecords(loadTrace(sys.argv[1])))
+last = optionFromArgs(sys.argv[2:], 'last')
+if last is not None:
+    records = records[-int(last):]
+for line in decodeTrace(records, OPCODE_SETS[optionFromArgs(sys.argv[2:], 'ops', 'day9')]):
+    print(line)
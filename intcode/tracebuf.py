@@ -0,0 +1,90 @@
+"""
+Binary execution traces: fixed-size records written into a bounded ring (in memory or a memory-mapped file) by the
+recording engine, and decoded into the tracing engine's text on demand.
+"""
+import mmap
+import struct
+
+from .ops import DAY9_OPS
+
+## file header: magic, record size, capacity (in records), records written so far (the ring keeps the last capacity)
+HEADER = struct.Struct('<8sIIQ')
+MAGIC = b'ICTRACE2'
+COUNT_OFFSET = 16
+
+## one record per instruction: pc, opcode, three parameters (unused ones 0), result, relative base before and after,
+## flags
+RECORD = struct.Struct('<qqqqqqqqB')
+MAX_PARAMS = 3
+FLAG_RESULT = 1 # the result field holds something (END has none)
+FLAG_WIDE = 2   # a value did not fit in 64 bits and was recorded as 0
+
+WORD_MIN = -(1 << 63)
+WORD_MAX = (1 << 63) - 1
+
+def describe(op, pc, params, result, base, rb):
+    """the trace line for one executed instruction (operators without a TRACE format just list their parameters)"""
+    if not hasattr(op, 'TRACE'):
+        return "[{}] {} {}".format(pc, op.__name__, " ".join(str(p) for p in params))
+    test = op.test(*params) if hasattr(op, 'test') else None
+    return "[{}] ".format(pc) + op.TRACE.format(*params, result=result, base=base, rb=rb, test=test)
+
+class TraceRecorder:
+    """
+    Ring buffer of the last capacity instruction records. With a path the ring is a memory-mapped file, so whatever
+    was recorded survives the process falling over.
+    """
+    def __init__(self, capacity=4096, path=None):
+        size = HEADER.size + capacity * RECORD.size
+        if path is None:
+            self.buf = bytearray(size)
+        else:
+            with open(path, 'w+b') as f:
+                f.truncate(size)
+                self.buf = mmap.mmap(f.fileno(), size)
+        self.capacity = capacity
+        self.count = 0
+        HEADER.pack_into(self.buf, 0, MAGIC, RECORD.size, capacity, 0)
+
+    def append(self, pc, opcode, params, result, base, rb):
+        flags = 0 if result is None else FLAG_RESULT
+        values = [pc, opcode] + list(params) + [0] * (MAX_PARAMS - len(params)) + [result or 0, base, rb]
+        if not all(WORD_MIN <= v <= WORD_MAX for v in values):
+            values = [v if WORD_MIN <= v <= WORD_MAX else 0 for v in values]
+            flags |= FLAG_WIDE
+        offset = HEADER.size + (self.count % self.capacity) * RECORD.size
+        RECORD.pack_into(self.buf, offset, *values, flags)
+        self.count += 1
+        struct.pack_into('<Q', self.buf, COUNT_OFFSET, self.count)
+
+    def records(self):
+        return readRecords(self.buf)
+
+    def close(self):
+        if isinstance(self.buf, mmap.mmap):
+            self.buf.flush()
+            self.buf.close()
+
+def readRecords(buf):
+    """(pc, opcode, params, result or None, relative base before, after, flags) for each record in buf, oldest first"""
+    magic, size, capacity, count = HEADER.unpack_from(buf, 0)
+    if magic != MAGIC or size != RECORD.size:
+        raise ValueError("not an Intcode trace")
+    for n in range(max(0, count - capacity), count):
+        pc, opcode, p0, p1, p2, result, base, rb, flags = RECORD.unpack_from(buf,
+                                                                             HEADER.size + (n % capacity) * RECORD.size)
+        yield pc, opcode, (p0, p1, p2), result if flags & FLAG_RESULT else None, base, rb, flags
+
+def loadTrace(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+def decodeTrace(records, opcodes=DAY9_OPS):
+    """render records as the tracing engine's per-instruction lines"""
+    ops = dict([(op.OPC, op) for op in opcodes])
+    for pc, opcode, params, result, base, rb, flags in records:
+        op = ops[opcode]
+        line = describe(op, pc, params[:len(op.PARAM)], result, base, rb)
+        if flags & FLAG_WIDE:
+            line += " (values wider than 64 bits recorded as 0)"
+        yield line
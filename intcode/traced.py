@@ -0,0 +1,73 @@
+from .ops import IND, GenericOp, OpOutput
+from .memory import Memory
+from .processor import IntcodeProcessor, OutputReady, getInput, writeOutput
+from .tracebuf import TraceRecorder, describe
+
+def traceResult(op, ipc, params, nextpc):
+    """what an instruction's trace line reports as {result}: the value it wrote, else where it goes next"""
+    for i, e in enumerate(op.PARAM):
+        if e == IND:
+            return ipc.dat[params[i]]
+    return nextpc
+
+def instrumentOp(op):
+    """
+    a subclass of op whose execute also hands the instruction to ipc.traceInstruction(), for the tracing engines'
+    dispatch tables
+    """
+    def execute(ipc, pc, *params):
+        base = ipc.relative_base
+        try:
+            nextpc = op.execute(ipc, pc, *params)
+        except (StopIteration, OutputReady):
+            ipc.traceInstruction(op, pc, params, None, base)
+            raise
+        ipc.traceInstruction(op, pc, params, traceResult(op, ipc, params, nextpc), base)
+        return nextpc
+    return type(op.__name__, (op,), {'execute': staticmethod(execute)})
+
+class TracingIntcodeProcessor(IntcodeProcessor):
+    """
+    Tracing engine: every instruction is decoded the long way round through GenericOp and dispatched through
+    instrumented operators, logging each parameter and instruction.
+
+    The other engines never look at the trace setting, so they do no formatting at all; makeIntcodeProcessor()
+    picks this one instead of them when tracing is on.
+    """
+    def __init__(self, opcodes, getInput=getInput, writeOutput=writeOutput):
+        IntcodeProcessor.__init__(self, opcodes, getInput, writeOutput)
+        self.ops = dict([(op.OPC, instrumentOp(op)) for op in opcodes])
+
+    def newMemory(self, program):
+        # flat; toList() leaves out what growing it padded with, so the dump after a trace stops where the data does
+        return Memory(program)
+
+    def log(self, line):
+        print(line)
+
+    def traceInstruction(self, op, pc, params, result, base):
+        if op.OPC == OpOutput.OPC and self.writeOutput is writeOutput:
+            return # the default endpoint has printed it already
+        self.log(describe(op, pc, params, result, base, self.relative_base))
+
+    def execute_one(self):
+        raw_opcode = self.dat[self.pc]
+        opcode = raw_opcode % 100
+        if not opcode in self.ops:
+            self.log("opcode {}({}) not recognised".format(raw_opcode, opcode))
+        op = self.ops[opcode]
+        return GenericOp.execute(op, raw_opcode, self, self.pc)
+
+class RecordingIntcodeProcessor(IntcodeProcessor):
+    """
+    Recording engine: runs on the decode cache like the decode engine, but through instrumented operators that append
+    a binary record per instruction to a TraceRecorder (a ring buffer in memory, or a memory-mapped file) instead of
+    printing anything. decodeTrace() turns the records back into the tracing engine's lines.
+    """
+    def __init__(self, opcodes, getInput=getInput, writeOutput=writeOutput, recorder=None):
+        IntcodeProcessor.__init__(self, opcodes, getInput, writeOutput)
+        self.ops = dict([(op.OPC, instrumentOp(op)) for op in opcodes])
+        self.recorder = recorder if recorder is not None else TraceRecorder()
+
+    def traceInstruction(self, op, pc, params, result, base):
+        self.recorder.append(pc, op.OPC, params, result, base, self.relative_base)
@@ -0,0 +1,9 @@
+TRACE=0
+def trace(s):
+    if TRACE:
+        print(s)
+
+def setTrace(on=True):
+    """switch the per-instruction trace output on (or off) for every machine"""
+    global TRACE
+    TRACE = 1 if on else 0
@@ -0,0 +1,71 @@
+"""
+Search every permutation of a set of phases for the one that maximises some evaluation of a program, sharding the
+permutations across a reusable process pool.
+
+Each task is a short prefix of the permutation, and the worker walks the remaining permutations itself, so only
+prefixes cross the process boundary. The program is shipped to each worker once when the pool starts.
+"""
+import concurrent.futures
+import itertools
+import os
+
+## per-worker state, set up by the pool initializer
+_evaluate = None
+_program = None
+
+def _initWorker(evaluate, program):
+    global _evaluate, _program
+    _evaluate = evaluate
+    _program = program
+
+def bestOf(evaluate, program, sequences):
+    """(max value, sequence) over sequences, or (0, None) if nothing beats 0"""
+    maxval = 0
+    maxseq = None
+    for seq in sequences:
+        val = evaluate(seq, program)
+        if val > maxval:
+            maxval = val
+            maxseq = seq
+    return maxval, maxseq
+
+def _searchPrefix(prefix, phases):
+    rest = [p for p in phases if p not in prefix]
+    return bestOf(_evaluate, _program, (prefix + tail for tail in itertools.permutations(rest)))
+
+class PermutationSearch:
+    """
+    A process pool primed with one program and evaluation function; call best() as often as needed, then close()
+    (or use it as a context manager).
+
+    evaluate(sequence, program) has to be picklable, i.e. a module level function or a functools.partial of one.
+    """
+    def __init__(self, evaluate, program, workers=None):
+        self.workers = workers or os.cpu_count()
+        self.pool = concurrent.futures.ProcessPoolExecutor(self.workers, initializer=_initWorker, initargs=(evaluate, program))
+
+    def best(self, phases, prefix_length=None):
+        phases = tuple(phases)
+        if prefix_length is None:
+            # enough prefixes to keep every worker busy, without making the tasks trivially small
+            prefix_length = 1
+            while prefix_length < len(phases) - 1 and len(phases) ** prefix_length < 4 * self.workers:
+                prefix_length += 1
+        prefixes = list(itertools.permutations(phases, min(prefix_length, len(phases))))
+        results = self.pool.map(_searchPrefix, prefixes, itertools.repeat(phases))
+        maxval = 0
+        maxseq = None
+        for val, seq in results:
+            if val > maxval:
+                maxval = val
+                maxseq = seq
+        return maxval, maxseq
+
+    def close(self):
+        self.pool.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,29 @@
+import intcode
+from intcode.engines import ENGINES, makeIntcodeProcessor
+
+## counter bump, compare and jump back: the threaded engine fuses all three into one step, the block engine
+## compiles them into one block
+LOOP = [1001, 100, 1, 100, 1007, 100, 1000, 101, 1005, 101, 0, 99]
+
+def preempted(engine, budget):
+    ipc = makeIntcodeProcessor(engine, traced=False)
+    ipc.start(LOOP)
+    status, _ = ipc.run_until_io(budget=budget)
+    return status, ipc.pc, ipc.dat[100]
+
+def test_every_engine_stops_on_the_same_instruction():
+    for budget in list(range(1, 12)) + [50, 100, 301, 1000]:
+        expected = preempted('decode', budget)
+        assert expected[0] == intcode.PREEMPTED
+        for engine in ENGINES:
+            assert preempted(engine, budget) == expected, (engine, budget)
+
+def test_budget_slices_add_up_to_a_whole_run():
+    for engine in ENGINES:
+        ipc = makeIntcodeProcessor(engine, traced=False)
+        ipc.start(LOOP)
+        slices = 0
+        while ipc.run_until_io(budget=7)[0] == intcode.PREEMPTED:
+            slices += 1
+        assert ipc.dat[100] == 1000, engine
+        assert slices == 3000 // 7, engine